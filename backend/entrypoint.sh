@@ -6,5 +6,6 @@ python manage.py migrate --no-input
 echo "Сбор статики бекенда..."
 python manage.py collectstatic --no-input
 
-echo "Запуск Gunicorn сервера..."
-exec gunicorn --bind 0.0.0.0:9000 foodgram.wsgi
+echo "Запуск Gunicorn сервера (ASGI, Uvicorn)..."
+exec gunicorn --bind 0.0.0.0:9000 -k uvicorn_worker.UvicornWorker \
+    foodgram.asgi:application
@@ -2,9 +2,14 @@ from django import forms
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
+from django.db import transaction
+from django.db.models import Q
 
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+from .models import (Favorite, Ingredient, Job, Recipe, RecipeIngredient,
                      ShoppingCart, Tag)
+from .shopping_list import (change_recipe_in_shopping_lists,
+                            get_recipe_amounts,
+                            remove_recipe_from_shopping_lists)
 
 User = get_user_model()
 
@@ -47,10 +52,41 @@ class RecipeAdmin(admin.ModelAdmin):
 
     def favorite_count(self, obj):
         """Подсчёт добавлений в избранное."""
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     favorite_count.short_description = 'В избранном'
 
+    def save_related(self, request, form, formsets, change):
+        """Переносит правки ингредиентов в списки покупок."""
+        before = get_recipe_amounts(form.instance) if change else {}
+        super().save_related(request, form, formsets, change)
+        after = get_recipe_amounts(form.instance)
+        deltas = {ingredient_id: after.get(ingredient_id, 0)
+                  - before.get(ingredient_id, 0)
+                  for ingredient_id in before.keys() | after.keys()}
+        change_recipe_in_shopping_lists(
+            form.instance,
+            {key: delta for key, delta in deltas.items() if delta})
+
+    def delete_model(self, request, obj):
+        remove_recipe_from_shopping_lists(obj)
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for recipe in queryset:
+            remove_recipe_from_shopping_lists(recipe)
+        super().delete_queryset(request, queryset)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по индексу полнотекстового поиска и имени автора."""
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        found = queryset.search(search_term).values('pk')
+        return queryset.filter(
+            Q(pk__in=found)
+            | Q(author__username__icontains=search_term)), False
+
 
 @admin.register(User)
 class FoodgramUserAdmin(UserAdmin):
@@ -102,3 +138,12 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     @admin.display(description='Recipe id')
     def get_recipe_id(self, obj):
         return obj.recipe.id
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Админка для фоновых задач."""
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at',
+                    'created_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('locked_at', 'last_error', 'created_at')
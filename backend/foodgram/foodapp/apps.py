@@ -5,3 +5,6 @@ class FoodappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodapp'
     verbose_name = 'Основное приложение проекта'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,333 @@
+from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import prefetch_related_objects
+from django.http import Http404, HttpResponse
+from django.shortcuts import redirect
+from django.views import View
+from django_filters.utils import translate_validation
+from rest_framework.exceptions import (APIException, AuthenticationFailed,
+                                       MethodNotAllowed, NotAuthenticated,
+                                       NotFound)
+from rest_framework.request import Request
+
+from .authentication import CachedTokenAuthentication
+from .cache import aget_version
+from .conditional import get_not_modified, make_etag, set_validators
+from .constants import FOODGRAM_URL, INGREDIENT_SEARCH_LIMIT
+from .filters import RecipeFilter
+from .models import Ingredient, Recipe
+from .pagination import CustomPagination
+from .recipe_cache import aget_cached_page
+from .registry import TAGS_VERSION, tag_registry
+from .renderers import FastJSONRenderer
+from .search import INGREDIENTS_VERSION, ingredient_index, search_ingredients
+from .serializers import (IngredientSerializer, RecipeReadSerializer,
+                          TagSerializer)
+from .shortlinks import short_links
+from .views import RECIPE_PREFETCH, RecipeViewSet, get_recipe_queryset
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status,
+                        content_type='application/json')
+
+
+async def aget_versions():
+    """Версии тегов и ингредиентов, входящие в ETag рецептов."""
+    return (await aget_version(TAGS_VERSION),
+            await aget_version(INGREDIENTS_VERSION))
+
+
+def get_recipes_etag(request, versions, recipes, *extra):
+    """ETag по времени изменения рецептов, флагам текущего
+    пользователя, данным авторов и версиям тегов и ингредиентов.
+    """
+    return make_etag(
+        request.build_absolute_uri(), *versions, *extra,
+        *((recipe.pk, recipe.updated_at.isoformat(),
+           recipe.favorites_count, recipe.is_favorited,
+           recipe.is_in_shopping_cart, recipe.is_subscribed,
+           recipe.author.email, recipe.author.username,
+           recipe.author.first_name, recipe.author.last_name,
+           recipe.author.avatar.name)
+          for recipe in recipes))
+
+
+def get_recipes_last_modified(request, recipes):
+    """Время изменения рецептов для заголовка Last-Modified.
+
+    Для пользователя ответ зависит еще и от его избранного, корзины
+    и подписок, которые updated_at не меняют, поэтому такие ответы
+    проверяются только по ETag.
+    """
+    if not request.user.is_anonymous:
+        return None
+    return max((recipe.updated_at.timestamp() for recipe in recipes),
+               default=None)
+
+
+async def aget_versioned_response(request, version_name, get_data):
+    """Ответ с ETag и Last-Modified по версии набора данных.
+
+    Пока версия не изменилась, на условный запрос отдается 304,
+    а корутина `get_data` не вызывается.
+    """
+    version = await aget_version(version_name)
+    etag = make_etag(version, request.get_full_path())
+    last_modified = version / 10 ** 9
+    not_modified = get_not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    return set_validators(json_response(await get_data()), etag,
+                          last_modified)
+
+
+def search_ingredient_index(query_params):
+    """Ингредиенты из индекса в памяти по параметрам 'search' или 'name'.
+
+    Если ни один из них не передан, возвращает None.
+    """
+    limit = query_params.get('limit', '')
+    # isdigit() пропускает надстрочные цифры вроде '²', на которых int()
+    # падает, поэтому проверяем isdecimal().
+    limit = int(limit) if limit.isdecimal() else None
+    search = query_params.get('search')
+    if search:
+        return search_ingredients(
+            search, min(limit or INGREDIENT_SEARCH_LIMIT,
+                        INGREDIENT_SEARCH_LIMIT))
+    name = query_params.get('name')
+    if name:
+        return ingredient_index.startswith(name, limit=limit)
+    return None
+
+
+class AsyncReadView(View, ABC):
+    """Представление, отвечающее на GET асинхронно.
+
+    Аутентификация, запросы к базе и кешу выполняются без блокировки
+    потока, поэтому медленный клиент или запрос не занимает воркер.
+    Ответы всегда отдаются в JSON, остальные методы запрещены.
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # csrf_exempt в Django 4.2 не поддерживает корутины,
+        # а для записи CSRF проверяет сам DRF.
+        view.csrf_exempt = True
+        return view
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            request = await self.initialize_request(request)
+            return await self.read(request, *args, **kwargs)
+        except Http404 as exc:
+            return self.handle_exception(NotFound(*exc.args))
+        except APIException as exc:
+            return self.handle_exception(exc)
+
+    @abstractmethod
+    async def read(self, request, *args, **kwargs):
+        """Ответ на GET; request — уже аутентифицированный Request DRF."""
+
+    async def http_method_not_allowed(self, request, *args, **kwargs):
+        response = self.handle_exception(MethodNotAllowed(request.method))
+        response['Allow'] = ', '.join(self._allowed_methods())
+        return response
+
+    @staticmethod
+    async def initialize_request(request):
+        user_auth = await CachedTokenAuthentication().aauthenticate(request)
+        request = Request(request)
+        request.user, request.auth = user_auth or (AnonymousUser(), None)
+        return request
+
+    @staticmethod
+    def handle_exception(exc):
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = json_response(data, status=exc.status_code)
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            response['WWW-Authenticate'] = (
+                CachedTokenAuthentication.keyword)
+        return response
+
+
+class AsyncRecipeView(AsyncReadView):
+    """Рецепты: GET отвечает асинхронно, остальные методы передаются
+    RecipeViewSet с действиями `actions`, так что запись работает
+    как раньше."""
+    http_method_names = View.http_method_names
+    actions = None
+    sync_view = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return super().as_view(
+            sync_view=sync_to_async(RecipeViewSet.as_view(cls.actions)),
+            **initkwargs)
+
+    async def delegate(self, request, *args, **kwargs):
+        response = await self.sync_view(request, *args, **kwargs)
+        if response.has_header('Allow'):
+            # GET вьюсету не передается, но обслуживается здесь.
+            response['Allow'] = f'GET, HEAD, {response["Allow"]}'
+        return response
+
+    post = put = patch = delete = options = delegate
+
+
+class RecipeListView(AsyncRecipeView):
+    """Список рецептов.
+
+    Страницы для анонимных пользователей берутся из общего кеша,
+    для остальных 304 отдается еще до сериализации.
+    """
+    actions = {'post': 'create'}
+    cursor_ordering = ('-created_at', '-id')
+    count_strategy = 'capped'
+
+    async def read(self, request):
+        if request.user.is_anonymous:
+            data, etag, last_modified = await aget_cached_page(
+                request, lambda: self.get_list_page(request))
+        else:
+            recipes, etag, last_modified = await self.paginate_recipes(
+                request)
+        not_modified = get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        if not request.user.is_anonymous:
+            data = await self.serialize_page(request, recipes)
+        return set_validators(json_response(data), etag, last_modified)
+
+    async def paginate_recipes(self, request):
+        """Страница рецептов с ее ETag и временем изменения."""
+        filterset = RecipeFilter(request.query_params,
+                                 get_recipe_queryset(request.user),
+                                 request=request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        self.paginator = CustomPagination()
+        recipes = await self.paginator.apaginate_queryset(
+            filterset.qs, request, view=self)
+        links = self.paginator.get_paginated_response([]).data
+        del links['results']
+        etag = get_recipes_etag(request, await aget_versions(), recipes,
+                                *links.items())
+        return recipes, etag, get_recipes_last_modified(request, recipes)
+
+    async def serialize_page(self, request, recipes):
+        # В Django 4.2 у prefetch_related_objects нет async-варианта.
+        await sync_to_async(prefetch_related_objects)(recipes,
+                                                      *RECIPE_PREFETCH)
+        serializer = RecipeReadSerializer(recipes, many=True,
+                                          context={'request': request})
+        return self.paginator.get_paginated_response(serializer.data).data
+
+    async def get_list_page(self, request):
+        recipes, etag, last_modified = await self.paginate_recipes(request)
+        return (await self.serialize_page(request, recipes), etag,
+                last_modified)
+
+
+class RecipeDetailView(AsyncRecipeView):
+    """Рецепт."""
+    actions = {'put': 'update', 'patch': 'partial_update',
+               'delete': 'destroy'}
+
+    async def read(self, request, pk):
+        recipe = await get_recipe_queryset(request.user).filter(
+            pk=pk).afirst()
+        if recipe is None:
+            raise Http404(f'No {Recipe._meta.object_name} '
+                          f'matches the given query.')
+        etag = get_recipes_etag(request, await aget_versions(), [recipe])
+        last_modified = get_recipes_last_modified(request, [recipe])
+        not_modified = get_not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        await sync_to_async(prefetch_related_objects)([recipe],
+                                                      *RECIPE_PREFETCH)
+        serializer = RecipeReadSerializer(recipe,
+                                          context={'request': request})
+        return set_validators(json_response(serializer.data), etag,
+                              last_modified)
+
+
+class TagListView(AsyncReadView):
+    """Список тегов из реестра в памяти."""
+
+    async def read(self, request):
+        return await aget_versioned_response(
+            request, TAGS_VERSION, sync_to_async(tag_registry.as_data))
+
+
+class TagDetailView(AsyncReadView):
+    """Тег из реестра в памяти."""
+
+    async def read(self, request, pk):
+        return await aget_versioned_response(
+            request, TAGS_VERSION, lambda: self.get_tag_data(pk))
+
+    @staticmethod
+    async def get_tag_data(pk):
+        tag = await sync_to_async(tag_registry.get)(pk)
+        if tag is None:
+            raise NotFound
+        return TagSerializer(tag).data
+
+
+class IngredientListView(AsyncReadView):
+    """Список ингредиентов.
+
+    Поиск обслуживается индексом в памяти, полный список читается
+    из базы асинхронно.
+    """
+
+    async def read(self, request):
+        return await aget_versioned_response(
+            request, INGREDIENTS_VERSION,
+            lambda: self.get_list_data(request))
+
+    @staticmethod
+    async def get_list_data(request):
+        ingredients = await sync_to_async(search_ingredient_index)(
+            request.query_params)
+        if ingredients is None:
+            ingredients = [ingredient async for ingredient in
+                           Ingredient.objects.values(
+                               *IngredientSerializer.Meta.fields)]
+        return ingredients
+
+
+class IngredientDetailView(AsyncReadView):
+    """Ингредиент."""
+
+    async def read(self, request, pk):
+        return await aget_versioned_response(
+            request, INGREDIENTS_VERSION, lambda: self.get_ingredient(pk))
+
+    @staticmethod
+    async def get_ingredient(pk):
+        ingredient = await Ingredient.objects.filter(pk=pk).values(
+            *IngredientSerializer.Meta.fields).afirst()
+        if ingredient is None:
+            raise NotFound
+        return ingredient
+
+
+async def redirect_short_link(request, hashcode):
+    """Перенаправляет с короткой ссылки
+    на страницу рецепта на фронтенде.
+    """
+    recipe_id = await short_links.aresolve(hashcode)
+    if recipe_id is None:
+        raise Http404
+    return redirect(f'{FOODGRAM_URL}recipes/{recipe_id}')
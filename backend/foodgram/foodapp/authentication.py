@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import (TokenAuthentication,
+                                           get_authorization_header)
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from .constants import AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TIMEOUT
+from .counters import COUNTERS
+
+User = get_user_model()
+
+# Счетчики меняются запросом UPDATE в обход save() и в кеш не попадают:
+# у восстановленного из кеша пользователя они отложены (deferred),
+# поэтому user.save() не перезапишет их устаревшими значениями.
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if (User, field.name) not in {
+        (model, name) for model, name, *_ in COUNTERS})
+
+
+def get_revision_key(key):
+    return f'foodgram:auth:revision:{key}'
+
+
+def get_revision(key):
+    """Текущая отметка токена в общем кеше.
+
+    Если отметки нет (еще не создана, истекла или вытеснена из кеша),
+    записывается новая: записи, сделанные с прежней отметкой, перестают
+    совпадать и перечитываются из базы.
+    """
+    revision_key = get_revision_key(key)
+    revision = cache.get(revision_key)
+    if revision is None:
+        cache.add(revision_key, time.time_ns(),
+                  timeout=AUTH_TOKEN_CACHE_TIMEOUT)
+        revision = cache.get(revision_key)
+    return revision
+
+
+async def aget_revision(key):
+    """Асинхронный вариант get_revision."""
+    revision_key = get_revision_key(key)
+    revision = await cache.aget(revision_key)
+    if revision is None:
+        await cache.aadd(revision_key, time.time_ns(),
+                         timeout=AUTH_TOKEN_CACHE_TIMEOUT)
+        revision = await cache.aget(revision_key)
+    return revision
+
+
+def revoke_tokens(keys):
+    """Объявляет устаревшими записи токенов в кешах всех процессов.
+
+    Отметка живет столько же, сколько запись в кеше: все записи,
+    сделанные до нее, к этому времени истекут сами.
+    """
+    cache.set_many({get_revision_key(key): time.time_ns() for key in keys},
+                   timeout=AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+class TokenCache:
+    """LRU-кеш соответствий токена и пользователя в памяти процесса.
+
+    Запись живет не дольше `timeout` секунд и действительна, пока
+    не изменилась отметка токена в общем кеше (см. revoke_tokens).
+    Хранятся значения полей, а не объект: каждый запрос получает
+    собственный экземпляр пользователя.
+    """
+
+    def __init__(self, maxsize=AUTH_TOKEN_CACHE_SIZE,
+                 timeout=AUTH_TOKEN_CACHE_TIMEOUT):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def get(self, key, revision):
+        """Пользователь по токену или None, если записи нет
+        или она устарела.
+
+        Без отметки (кеш недоступен) записи не доверяем.
+        """
+        if revision is None:
+            return None
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires, entry_revision, values = entry
+            if expires < time.monotonic() or entry_revision != revision:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+        return self.make_user(values)
+
+    def put(self, key, revision, values):
+        if revision is None:
+            return self.make_user(values)
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.timeout, revision,
+                                values)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return self.make_user(values)
+
+    @staticmethod
+    def make_user(values):
+        return User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешем пользователей в памяти.
+
+    Повторные запросы с тем же токеном не обращаются к базе: проверяется
+    только отметка токена в общем кеше. Удаление токена (token/logout)
+    и сохранение пользователя, в том числе деактивация, сбрасывают
+    запись во всех процессах сразу (см. signals.py). Изменения в обход
+    save(), например QuerySet.update(), видны не позже чем через
+    AUTH_TOKEN_CACHE_TIMEOUT секунд.
+    """
+
+    def authenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        revision = get_revision(key)
+        user = token_cache.get(key, revision)
+        if user is None:
+            user = self.remember(key, revision, self.get_queryset(key).first())
+        return self.check_user(user, key)
+
+    async def aauthenticate(self, request):
+        """Асинхронный вариант authenticate для async-представлений."""
+        key = self.get_key(request)
+        if key is None:
+            return None
+        revision = await aget_revision(key)
+        user = token_cache.get(key, revision)
+        if user is None:
+            user = self.remember(key, revision,
+                                 await self.get_queryset(key).afirst())
+        return self.check_user(user, key)
+
+    def get_key(self, request):
+        """Токен из заголовка Authorization или None, если его нет."""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise AuthenticationFailed(
+                _('Invalid token header. No credentials provided.'))
+        if len(auth) > 2:
+            raise AuthenticationFailed(_(
+                'Invalid token header. '
+                'Token string should not contain spaces.'))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed(_(
+                'Invalid token header. '
+                'Token string should not contain invalid characters.'))
+
+    @staticmethod
+    def get_queryset(key):
+        return User.objects.filter(auth_token__key=key).values_list(
+            *USER_FIELDS)
+
+    @staticmethod
+    def remember(key, revision, values):
+        if values is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+        return token_cache.put(key, revision, values)
+
+    @staticmethod
+    def check_user(user, key):
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return user, Token.from_db(DEFAULT_DB_ALIAS, ('key', 'user_id'),
+                                   (key, user.pk))
@@ -0,0 +1,71 @@
+"""Общие функции для команд замера производительности."""
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag, User
+from .views import RECIPE_PREFETCH, get_recipe_queryset
+
+
+def measure(func, repeat):
+    """Вызывает func repeat раз и возвращает длительности в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def format_timings(label, timings):
+    """Строка отчета: медиана, 95-й перцентиль и максимум."""
+    return (f'{label}: медиана {statistics.median(timings):.3f} мс, '
+            f'p95 {percentile(timings, 0.95):.3f} мс, '
+            f'максимум {max(timings):.3f} мс')
+
+
+def create_recipe_page(recipes_amount, ingredients_amount):
+    """Синтетическая страница рецептов и анонимный запрос к списку.
+
+    Рецепты загружаются так же, как для GET /api/recipes/. Вызывать
+    внутри транзакции, которую команда затем откатывает.
+    """
+    author = User.objects.create(
+        username='benchmark', email='benchmark@example.com',
+        first_name='Автор', last_name='Замеров')
+    tags = Tag.objects.bulk_create(
+        Tag(name=f'Тег замера {i}', slug=f'benchmark-{i}') for i in range(3))
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент замера {i}', measurement_unit='г')
+        for i in range(ingredients_amount))
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'Рецепт замера {i}',
+               text='Описание рецепта с «кавычками» и шагами. ' * 20,
+               image='recipes/benchmark.jpg', cooking_time=10 + i)
+        for i in range(recipes_amount))
+    RecipeTag.objects.bulk_create(
+        RecipeTag(recipe=recipe, tag=tag)
+        for recipe in recipes for tag in tags[:2])
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=i + 1)
+        for recipe in recipes for i, ingredient in enumerate(ingredients))
+    # Ссылки на изображения строятся от хоста запроса, а он должен
+    # проходить проверку ALLOWED_HOSTS.
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                 if host != '*'), 'localhost')
+    request = Request(APIRequestFactory().get('/api/recipes/',
+                                              HTTP_HOST=host))
+    request.user = AnonymousUser()
+    page = list(get_recipe_queryset(request.user)
+                .prefetch_related(*RECIPE_PREFETCH)
+                .filter(author=author).order_by('-created_at', '-id'))
+    return request, page
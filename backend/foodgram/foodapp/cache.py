@@ -0,0 +1,36 @@
+import time
+
+from django.core.cache import cache
+
+
+def get_version_key(name):
+    return f'foodgram:version:{name}'
+
+
+def get_version(name):
+    """Возвращает текущую версию набора данных `name`.
+
+    Версия хранится в общем кеше Django, поэтому её изменение
+    видят все процессы, использующие тот же бэкенд кеша.
+    """
+    key = get_version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(name):
+    """Асинхронный вариант get_version."""
+    key = get_version_key(name)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(name):
+    """Объявляет устаревшими все данные, закешированные для `name`."""
+    cache.set(get_version_key(name), time.time_ns(), timeout=None)
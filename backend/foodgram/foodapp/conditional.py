@@ -0,0 +1,34 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Строгий ETag из значений, от которых зависит представление."""
+    value = ':'.join(map(str, parts))
+    return f'"{hashlib.md5(value.encode()).hexdigest()}"'
+
+
+def get_not_modified(request, etag, last_modified=None):
+    """Ответ 304, если у клиента актуальная версия, иначе None.
+
+    `last_modified` — время в секундах. Как и требует RFC 9110,
+    If-Modified-Since учитывается, только если нет If-None-Match.
+    """
+    response = get_conditional_response(
+        request, etag=etag,
+        last_modified=int(last_modified) if last_modified else None)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    """Проставляет ответу ETag и Last-Modified."""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    # Флаги текущего пользователя входят в представление.
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -8,7 +8,40 @@ TAG_NAME_MAX_LEN = 20
 TAG_SLUG_MAX_LEN = 20
 RECIPE_NAME_MAX_LEN = 200
 RECIPE_HASHCODE_MAX_LEN = 3
+SHORT_LINK_MIN_LEN = 4
+# Наибольшее значение BigAutoField.
+RECIPE_ID_MAX = 2 ** 63 - 1
+SHORT_LINK_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TIMEOUT = 5 * 60
+RECIPE_SEARCH_CONFIG = 'russian'
 PAGE_SIZE = 10
+PAGINATION_COUNT_CAP = 1000
 INGREDIENT_MIN_AMOUNT = 1
 MIN_COOKING_TIME = 1
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SIMILARITY_THRESHOLD = 0.3
 DEFAULT_RECIPES_AMOUNT_AT_SUBSCRIPTIONS_PAGE = 3
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+IMAGE_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+IMAGE_MAX_PIXELS = 25_000_000
+IMAGE_DECODE_CHUNK_SIZE = 64 * 1024
+# Допустимые форматы Pillow и расширения, под которыми сохраняются файлы.
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+IMAGE_VARIANTS = {'thumbnail': 320, 'card': 640, 'full': 1600}
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_QUALITY = 82
+JOB_NAME_MAX_LEN = 100
+JOB_KEY_MAX_LEN = 200
+JOB_STATUS_MAX_LEN = 20
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_LOCK_TIMEOUT = 10 * 60
+JOB_POLL_INTERVAL = 1
+MEDIA_GC_GRACE_PERIOD = 24 * 60 * 60
+RECIPE_LIST_CACHE_LOCK_TIMEOUT = 10
+RECIPE_LIST_CACHE_WAIT = 2
+RECIPE_LIST_CACHE_POLL_INTERVAL = 0.05
+LOADER_BATCH_SIZE = 5000
+LOADER_READ_CHUNK_SIZE = 64 * 1024
+LOADER_PROGRESS_INTERVAL = 1
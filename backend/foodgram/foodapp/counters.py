@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, ShoppingCart, Subscription
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta, **changes):
+    """Атомарно изменяет счетчик `field` записи `pk` на `delta`.
+
+    Поля из `changes` обновляются тем же запросом.
+    """
+    if delta:
+        model.objects.filter(pk=pk).update(**{field: F(field) + delta},
+                                           **changes)
+
+
+def count_related(related_model, lookup):
+    """Подзапрос с числом связанных записей для каждой строки."""
+    return Coalesce(Subquery(
+        related_model.objects
+        .filter(**{lookup: OuterRef('pk')})
+        .order_by()
+        .values(lookup)
+        .annotate(count=Count('pk'))
+        .values('count')), Value(0))
+
+
+def recount_counters():
+    """Пересчитывает все счетчики и исправляет разошедшиеся значения.
+
+    Возвращает число исправленных строк для каждого счетчика.
+    """
+    repaired = {}
+    for model, field, related_model, lookup in COUNTERS:
+        actual = count_related(related_model, lookup)
+        repaired[f'{model.__name__}.{field}'] = (
+            model.objects.exclude(**{field: actual})
+            .update(**{field: actual}))
+    return repaired
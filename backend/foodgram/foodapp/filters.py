@@ -10,6 +10,7 @@ class RecipeFilter(filters.FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_by_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    q = filters.CharFilter(method='filter_by_text')
 
     def filter_by_tags(self, queryset, name, value):
         tag_slugs = self.data.getlist('tags')
@@ -33,6 +34,9 @@ class RecipeFilter(filters.FilterSet):
                                                    recipe=OuterRef('pk'))))
         return queryset
 
+    def filter_by_text(self, queryset, name, value):
+        return queryset.search(value)
+
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart', 'q')
@@ -0,0 +1,177 @@
+import base64
+import binascii
+import io
+import os
+import tempfile
+import warnings
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .constants import (IMAGE_DECODE_CHUNK_SIZE, IMAGE_FORMATS,
+                        IMAGE_MAX_PIXELS, IMAGE_MAX_UPLOAD_SIZE,
+                        IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_QUALITY,
+                        IMAGE_VARIANTS)
+
+# Pillow сам отказывается открывать изображения больше 2 * MAX_IMAGE_PIXELS,
+# но размеры проверяются по заголовку еще до декодирования.
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+DATA_URL_PREFIX = 'data:image/'
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def decode_base64_image(data):
+    """Декодирует изображение из data URL в файл.
+
+    Размер проверяется по длине строки до декодирования, а сама строка
+    декодируется частями во временный файл, который уходит на диск,
+    если не помещается в SPOOL_MAX_SIZE. Расширение файла определяется
+    по формату, распознанному Pillow, а не по заголовку data URL.
+    """
+    if not isinstance(data, str) or not data.startswith(DATA_URL_PREFIX):
+        raise ValidationError('Ожидается изображение в формате base64.')
+    _, separator, encoded = data.partition(';base64,')
+    if not separator:
+        raise ValidationError('Ожидается изображение в формате base64.')
+    # Переводы строк и пробелы внутри base64 допустимы, но сдвинули бы
+    # границы частей, которые должны быть кратны четырем символам.
+    encoded = ''.join(encoded.split())
+    if len(encoded) // 4 * 3 > IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            f'Размер изображения превышает '
+            f'{IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} МБ.')
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        for start in range(0, len(encoded), IMAGE_DECODE_CHUNK_SIZE):
+            file.write(base64.b64decode(
+                encoded[start:start + IMAGE_DECODE_CHUNK_SIZE]))
+    except (binascii.Error, ValueError):
+        file.close()
+        raise ValidationError('Некорректные данные base64.')
+    file.seek(0)
+    format_ = check_image(file)
+    return File(file, name=f'image.{IMAGE_FORMATS[format_]}')
+
+
+def check_image(file):
+    """Проверяет формат и размеры изображения по заголовку файла
+    и целостность файла через Image.verify().
+
+    Возвращает формат изображения.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(file) as image:
+                format_, (width, height) = image.format, image.size
+                image.verify()
+    except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+        raise ValidationError('Слишком большое разрешение изображения.')
+    except (OSError, SyntaxError, ValueError):
+        # verify() сообщает о поврежденном PNG через SyntaxError.
+        raise ValidationError('Файл не является изображением.')
+    finally:
+        file.seek(0)
+    if format_ not in IMAGE_FORMATS:
+        raise ValidationError(
+            f'Поддерживаются форматы: {", ".join(IMAGE_FORMATS)}.')
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValidationError('Слишком большое разрешение изображения.')
+    return format_
+
+
+def get_variant_name(name, variant, format_):
+    """Путь варианта изображения рядом с оригиналом."""
+    return f'{os.path.splitext(name)[0]}.{variant}.{format_}'
+
+
+def get_variants_ready_key(name):
+    return f'image_variants:{name}'
+
+
+def variants_ready(field_file):
+    """Созданы ли уменьшенные копии изображения.
+
+    Копии создает фоновая задача, и до ее завершения их нет. Готовность
+    отмечается в кеше; без отметки проверяется наличие в хранилище копии,
+    которую make_image_variants создает последней.
+    """
+    key = get_variants_ready_key(field_file.name)
+    if cache.get(key):
+        return True
+    last_variant = get_variant_name(field_file.name, list(IMAGE_VARIANTS)[-1],
+                                    IMAGE_VARIANT_FORMATS[-1])
+    if not field_file.storage.exists(last_variant):
+        return False
+    cache.set(key, True, None)
+    return True
+
+
+def render_variant(image, size, format_):
+    """Уменьшает изображение и кодирует его в нужный формат."""
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if format_ == 'jpeg' and variant.mode != 'RGB':
+        variant = variant.convert('RGBA')
+        background = Image.new('RGB', variant.size, 'white')
+        background.paste(variant, mask=variant.getchannel('A'))
+        variant = background
+    buffer = io.BytesIO()
+    variant.save(buffer, format_.upper(), quality=IMAGE_VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+def make_image_variants(field_file, force=False):
+    """Создает уменьшенные копии изображения во всех форматах.
+
+    Уже существующие копии пересоздаются только при `force`: имя
+    оригинала однозначно определяет его содержимое. Возвращает True,
+    если была создана хотя бы одна копия.
+    """
+    if not field_file:
+        return False
+    created = False
+    storage = field_file.storage
+    # Хранилище по хешу содержимого сохраняло бы копии под своими именами.
+    save = getattr(storage, 'save_derived', storage.save)
+    with field_file.open('rb'), Image.open(field_file) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert(
+                'RGBA' if image.has_transparency_data else 'RGB')
+        for variant, size in IMAGE_VARIANTS.items():
+            for format_ in IMAGE_VARIANT_FORMATS:
+                name = get_variant_name(field_file.name, variant, format_)
+                if storage.exists(name):
+                    if not force:
+                        continue
+                    storage.delete(name)
+                save(name, ContentFile(render_variant(image, size, format_)))
+                created = True
+    cache.set(get_variants_ready_key(field_file.name), True, None)
+    return created
+
+
+def get_image_variants(field_file, request=None):
+    """Ссылки на варианты изображения: {вариант: {формат: url}}.
+
+    Пока копии не созданы, вместо них отдается ссылка на оригинал.
+    """
+    if not field_file:
+        return None
+    ready = variants_ready(field_file)
+    variants = {}
+    for variant in IMAGE_VARIANTS:
+        variants[variant] = {}
+        for format_ in IMAGE_VARIANT_FORMATS:
+            name = (get_variant_name(field_file.name, variant, format_)
+                    if ready else field_file.name)
+            url = field_file.storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            variants[variant][format_] = url
+    return variants
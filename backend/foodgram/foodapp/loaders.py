@@ -0,0 +1,257 @@
+import csv
+import io
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+
+from .cache import bump_version
+from .constants import (LOADER_BATCH_SIZE, LOADER_PROGRESS_INTERVAL,
+                        LOADER_READ_CHUNK_SIZE)
+
+FORMATS = ('json', 'csv')
+
+
+def read_json_items(file, chunk_size=LOADER_READ_CHUNK_SIZE):
+    """Элементы JSON-массива по одному, без чтения файла целиком.
+
+    Файл читается частями, а каждый элемент разбирается
+    json.JSONDecoder.raw_decode, как только он полностью прочитан.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    started = False
+    while True:
+        while position < len(buffer) and (buffer[position].isspace()
+                                          or started
+                                          and buffer[position] == ','):
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise ValueError('Файл оборвался до конца JSON-массива.')
+            buffer, position = file.read(chunk_size), 0
+            eof = not buffer
+            continue
+        if not started:
+            if buffer[position] != '[':
+                raise ValueError('Ожидается JSON-массив.')
+            started = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        position = end
+        yield item
+
+
+def read_csv_items(file, fields):
+    """Строки CSV как словари с полями `fields`.
+
+    Первая строка пропускается, если это заголовок с именами полей.
+    """
+    for number, row in enumerate(csv.reader(file), start=1):
+        if not row:
+            continue
+        if number == 1 and [value.strip() for value in row] == list(fields):
+            continue
+        if len(row) != len(fields):
+            raise ValueError(f'Строка {number}: ожидается полей: '
+                             f'{len(fields)}, получено: {len(row)}.')
+        yield dict(zip(fields, row))
+
+
+def get_rows(items, fields):
+    """Кортежи значений полей с проверкой, что все поля заполнены."""
+    for number, item in enumerate(items, start=1):
+        try:
+            row = tuple(str(item[field]).strip() for field in fields)
+        except (KeyError, TypeError):
+            raise ValueError(f'Запись {number}: нужны поля '
+                             f'{", ".join(fields)}.')
+        if not all(row):
+            raise ValueError(f'Запись {number}: пустое значение.')
+        yield row
+
+
+def get_batches(rows, size, key_index):
+    """Пачки по `size` строк без повторов ключа внутри пачки.
+
+    Повтор ключа в одном INSERT ... ON CONFLICT DO UPDATE PostgreSQL
+    не принимает, поэтому из повторов остается последний.
+    """
+    batch = {}
+    for row in rows:
+        batch[row[key_index]] = row
+        if len(batch) >= size:
+            yield list(batch.values())
+            batch = {}
+    if batch:
+        yield list(batch.values())
+
+
+class LoadCommand(BaseCommand):
+    """Основа команд загрузки справочников из JSON или CSV.
+
+    Записи читаются потоком и добавляются пачками: новые создаются,
+    существующие (по полю `unique_field`) обновляются или, с ключом
+    --ignore-existing, остаются как есть. Вся загрузка выполняется
+    в одной транзакции, поэтому повторный запуск безопасен, а ошибка
+    в середине файла ничего не меняет.
+    """
+    model = None
+    fields = ()
+    unique_field = None
+    version_name = None
+    verbose_name = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str,
+                            help='Путь к файлу .json или .csv.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла, если его не видно по расширению.')
+        parser.add_argument(
+            '--batch-size', type=int, default=LOADER_BATCH_SIZE,
+            help='Число записей в одном запросе.')
+        parser.add_argument(
+            '--ignore-existing', action='store_true',
+            help='Не обновлять уже загруженные записи.')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загружать через COPY во временную таблицу '
+                 '(только PostgreSQL), быстрее для больших файлов.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Проверить файл и загрузку, отменив изменения.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format_ = (options['format']
+                   or os.path.splitext(path)[1].lstrip('.').lower())
+        if format_ not in FORMATS:
+            raise CommandError(
+                'Не удалось определить формат файла, укажите --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy поддерживается только в PostgreSQL.')
+        self.verbosity = options['verbosity']
+        self.started = self.reported = time.monotonic()
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as file:
+                items = (read_json_items(file) if format_ == 'json'
+                         else read_csv_items(file, self.fields))
+                with transaction.atomic():
+                    before = self.model.objects.count()
+                    processed = self.load(
+                        get_rows(items, self.fields), options)
+                    created = self.model.objects.count() - before
+                    if options['dry_run']:
+                        transaction.set_rollback(True)
+                    else:
+                        transaction.on_commit(
+                            lambda: bump_version(self.version_name))
+        except FileNotFoundError:
+            raise CommandError(f'Файл не найден: {path}')
+        except ValueError as error:
+            raise CommandError(f'Ошибка в файле {path}: {error}')
+        except IntegrityError as error:
+            raise CommandError(f'Ошибка при загрузке: {error}')
+        elapsed = time.monotonic() - self.started
+        message = (f'{self.verbose_name}: обработано {processed}, '
+                   f'добавлено {created}, за {elapsed:.1f} с '
+                   f'({processed / max(elapsed, 1e-6):.0f} записей/с).')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'{message} Пробный запуск, изменения отменены.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def load(self, rows, options):
+        batches = get_batches(rows, options['batch_size'],
+                              self.fields.index(self.unique_field))
+        if options['copy']:
+            return self.copy(batches, options['ignore_existing'])
+        update_fields = [field for field in self.fields
+                         if field != self.unique_field]
+        processed = 0
+        for batch in batches:
+            objects = [self.model(**dict(zip(self.fields, row)))
+                       for row in batch]
+            if options['ignore_existing']:
+                self.model.objects.bulk_create(objects,
+                                               ignore_conflicts=True)
+            else:
+                self.model.objects.bulk_create(
+                    objects, update_conflicts=True,
+                    unique_fields=[self.unique_field],
+                    update_fields=update_fields)
+            processed += len(batch)
+            self.report_progress(processed)
+        return processed
+
+    def copy(self, batches, ignore_existing):
+        """Загрузка через COPY во временную таблицу и один
+        INSERT ... ON CONFLICT из нее."""
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        staging = connection.ops.quote_name(
+            f'{self.model._meta.db_table}_staging')
+        columns = ', '.join(connection.ops.quote_name(field)
+                            for field in self.fields)
+        key = connection.ops.quote_name(self.unique_field)
+        if ignore_existing:
+            on_conflict = 'DO NOTHING'
+        else:
+            changes = [connection.ops.quote_name(field)
+                       for field in self.fields
+                       if field != self.unique_field]
+            on_conflict = (
+                'DO UPDATE SET '
+                + ', '.join(f'{name} = EXCLUDED.{name}' for name in changes)
+                + ' WHERE '
+                + ' OR '.join(f'{table}.{name} IS DISTINCT FROM '
+                              f'EXCLUDED.{name}' for name in changes))
+        processed = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {table} WITH NO DATA')
+            cursor.execute(
+                f'ALTER TABLE {staging} ADD COLUMN line bigserial')
+            for batch in batches:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f'COPY {staging} ({columns}) FROM STDIN '
+                    f'WITH (FORMAT csv)', buffer)
+                processed += len(batch)
+                self.report_progress(processed)
+            # Из повторов ключа в разных пачках остается последний.
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT DISTINCT ON ({key}) {columns} FROM {staging} '
+                f'ORDER BY {key}, line DESC '
+                f'ON CONFLICT ({key}) {on_conflict}')
+        return processed
+
+    def report_progress(self, processed):
+        now = time.monotonic()
+        if (self.verbosity > 1
+                or now - self.reported >= LOADER_PROGRESS_INTERVAL):
+            self.reported = now
+            elapsed = now - self.started
+            self.stdout.write(
+                f'Обработано записей: {processed} '
+                f'({processed / max(elapsed, 1e-6):.0f} записей/с)')
@@ -0,0 +1,66 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks import format_timings
+from ...models import Ingredient
+from ...search import ingredient_index
+
+
+def search_orm(prefix):
+    """Прежний путь: запрос name__istartswith к базе."""
+    return list(Ingredient.objects.filter(name__istartswith=prefix)
+                .values('id', 'name', 'measurement_unit'))
+
+
+def search_index(prefix):
+    return ingredient_index.startswith(prefix)
+
+
+class Command(BaseCommand):
+    help = ('Сравнить автодополнение ингредиентов по индексу в памяти '
+            'с запросом к базе при большом числе запросов. '
+            'Ингредиенты должны быть загружены (load_ingredients).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=20000,
+            help='Количество запросов для каждого способа.')
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Количество одновременно работающих потоков.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('Нет ингредиентов: сначала выполните '
+                               'load_ingredients.')
+        rng = random.Random(options['seed'])
+        # Автодополнение отправляет запрос на каждое нажатие клавиши:
+        # префиксы из одной-трех первых букв названий.
+        prefixes = [name[:rng.randint(1, 3)]
+                    for name in rng.choices(names, k=options['requests'])]
+        # Индекс строится лениво; первое построение в замер не входит.
+        ingredient_index.get_data()
+        self.stdout.write(f'Ингредиентов: {len(names)}, '
+                          f'запросов: {len(prefixes)}, '
+                          f'потоков: {options["threads"]}')
+        for label, search in (('база', search_orm), ('индекс', search_index)):
+            self.run(label, search, prefixes, options['threads'])
+
+    def run(self, label, search, prefixes, threads):
+        def timed(prefix):
+            started = time.perf_counter()
+            search(prefix)
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(threads) as executor:
+            started = time.perf_counter()
+            timings = list(executor.map(timed, prefixes))
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{format_timings(label, timings)}, '
+            f'{len(prefixes) / elapsed:.0f} запросов/с')
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from ...benchmarks import create_recipe_page, format_timings, measure
+from ...renderers import FastJSONRenderer, orjson
+from ...serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    help = ('Сравнить время рендеринга страницы рецептов стандартным '
+            'JSONRenderer и FastJSONRenderer. Данные создаются '
+            'в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=50,
+            help='Количество рецептов на странице.')
+        parser.add_argument(
+            '--ingredients', type=int, default=10,
+            help='Количество ингредиентов в рецепте.')
+        parser.add_argument(
+            '--repeat', type=int, default=500,
+            help='Количество повторов рендеринга.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            request, page = create_recipe_page(options['recipes'],
+                                               options['ingredients'])
+            results = RecipeSerializer(page, many=True,
+                                       context={'request': request}).data
+            transaction.set_rollback(True)
+        data = {'count': len(results), 'next': None, 'previous': None,
+                'results': results}
+        body = JSONRenderer().render(data)
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен: FastJSONRenderer использует '
+                'стандартный рендерер.'))
+        self.stdout.write(
+            f'Рецептов: {len(results)}, размер ответа: {len(body)} байт, '
+            f'ответы совпадают: {FastJSONRenderer().render(data) == body}')
+        for label, renderer in (('JSONRenderer', JSONRenderer()),
+                                ('FastJSONRenderer', FastJSONRenderer())):
+            self.stdout.write(format_timings(label, measure(
+                lambda: renderer.render(data), options['repeat'])))
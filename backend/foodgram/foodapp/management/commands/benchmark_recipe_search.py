@@ -0,0 +1,120 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from ...benchmarks import format_timings, measure
+from ...constants import PAGE_SIZE, RECIPE_SEARCH_CONFIG
+from ...models import Recipe, User
+from ...pagination import CappedCountPaginator
+
+SYLLABLES = ('ба', 'ва', 'го', 'да', 'же', 'зи', 'ка', 'ло', 'ми', 'но',
+             'па', 'ру', 'са', 'то', 'фи', 'ха', 'че', 'шу', 'ле', 'ро')
+NAME_WORDS = 2
+TEXT_WORDS = 12
+# Показатель степени для выбора слова: чем он больше, тем сильнее
+# частотность слов похожа на закон Ципфа.
+WORD_SKEW = 3
+QUERY_RANKS = (1, 10, 100, 1000)
+
+
+def make_vocabulary(size, seed):
+    """Псевдослова из трех-четырех слогов, без повторов."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES)
+                          for _ in range(rng.randint(3, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+
+def word_sql(words_count):
+    """SQL-выражение из words_count случайных слов словаря `w`."""
+    word = f'w[1 + floor(power(random(), {WORD_SKEW}) * n)::int]'
+    return " || ' ' || ".join([word] * words_count)
+
+
+class Command(BaseCommand):
+    help = ('Замерить полнотекстовый поиск рецептов (?q=) на синтетических '
+            'данных. Данные создаются в транзакции и откатываются. '
+            'Только для PostgreSQL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=1_000_000,
+            help='Количество синтетических рецептов.')
+        parser.add_argument(
+            '--vocabulary', type=int, default=5000,
+            help='Размер словаря синтетических слов.')
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Количество повторов каждого запроса.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Замер поиска требует PostgreSQL.')
+        vocabulary = make_vocabulary(options['vocabulary'], options['seed'])
+        with transaction.atomic():
+            self.fill(options['recipes'], vocabulary)
+            queries = [vocabulary[rank - 1] for rank in QUERY_RANKS
+                       if rank <= len(vocabulary)]
+            queries.append(f'{vocabulary[0]} {vocabulary[9]}')
+            for query in queries:
+                self.benchmark(query, options['repeat'])
+            transaction.set_rollback(True)
+        # Откаченные строки остаются мертвыми и замедлили бы следующий
+        # замер и рабочие запросы.
+        with connection.cursor() as cursor:
+            cursor.execute(f'VACUUM ANALYZE {Recipe._meta.db_table}')
+
+    def fill(self, recipes, vocabulary):
+        author = User.objects.create(
+            username='benchmark', email='benchmark@example.com')
+        self.stdout.write(f'Создание {recipes} рецептов...')
+        timings = measure(lambda: self.insert(author, recipes, vocabulary), 1)
+        self.stdout.write(f'Вставка и индексация: {timings[0] / 1000:.1f} с')
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+
+    def insert(self, author, recipes, vocabulary):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                INSERT INTO {Recipe._meta.db_table}
+                    (author_id, name, image, text, cooking_time,
+                     created_at, updated_at, favorites_count,
+                     in_carts_count, search_vector)
+                SELECT %(author)s, name, 'recipes/benchmark.jpg', text,
+                       1 + (random() * 120)::int,
+                       now() - i * interval '1 minute', now(), 0, 0,
+                       setweight(to_tsvector(%(config)s, name), 'A')
+                       || setweight(to_tsvector(%(config)s, text), 'B')
+                FROM (
+                    SELECT i, {word_sql(NAME_WORDS)} AS name,
+                           {word_sql(TEXT_WORDS)} AS text
+                    FROM generate_series(1, %(recipes)s) AS i,
+                         (SELECT %(words)s::text[] AS w,
+                                 %(size)s AS n) AS vocabulary
+                ) AS generated
+                ''',
+                {'author': author.pk, 'config': RECIPE_SEARCH_CONFIG,
+                 'recipes': recipes, 'words': vocabulary,
+                 'size': len(vocabulary)})
+
+    def benchmark(self, query, repeat):
+        found = Recipe.objects.search(query)
+        # Те же запросы, что делает список рецептов: первая страница
+        # по релевантности и количество, ограниченное пагинатором.
+        page = found.values_list('pk', flat=True)[:PAGE_SIZE]
+        self.stdout.write(
+            f'«{query}»: найдено {found.count()}, '
+            f'на странице {len(list(page))}')
+        self.stdout.write('  ' + format_timings(
+            'страница', measure(lambda: list(page.all()), repeat)))
+        self.stdout.write('  ' + format_timings(
+            'количество', measure(
+                lambda: CappedCountPaginator(found, PAGE_SIZE).count,
+                repeat)))
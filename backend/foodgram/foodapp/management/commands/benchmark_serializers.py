@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...benchmarks import create_recipe_page, format_timings, measure
+from ...serializers import RecipeReadSerializer, RecipeSerializer
+
+
+class Command(BaseCommand):
+    help = ('Сравнить пропускную способность RecipeSerializer '
+            'и RecipeReadSerializer на странице рецептов. Данные создаются '
+            'в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=50,
+            help='Количество рецептов на странице.')
+        parser.add_argument(
+            '--ingredients', type=int, default=10,
+            help='Количество ингредиентов в рецепте.')
+        parser.add_argument(
+            '--repeat', type=int, default=200,
+            help='Количество повторов сериализации.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            request, page = create_recipe_page(options['recipes'],
+                                               options['ingredients'])
+            context = {'request': request}
+            identical = (
+                RecipeReadSerializer(page, many=True, context=context).data
+                == RecipeSerializer(page, many=True, context=context).data)
+            self.stdout.write(
+                f'Рецептов: {len(page)}, ответы совпадают: {identical}')
+            for serializer_class in (RecipeSerializer, RecipeReadSerializer):
+                timings = measure(
+                    lambda: serializer_class(page, many=True,
+                                             context=context).data,
+                    options['repeat'])
+                recipes_per_second = (len(page) * len(timings)
+                                      / sum(timings) * 1000)
+                self.stdout.write(
+                    f'{format_timings(serializer_class.__name__, timings)}, '
+                    f'{recipes_per_second:.0f} рецептов/с')
+            transaction.set_rollback(True)
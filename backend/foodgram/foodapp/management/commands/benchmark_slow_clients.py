@@ -0,0 +1,96 @@
+import asyncio
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks import format_timings
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест запущенного сервера медленными клиентами. '
+            'Клиенты приходят равномерно, каждый N-й посреди отправки '
+            'заголовков делает паузу. Показывает задержку быстрых клиентов '
+            'и сколько запросов воркер обслуживает одновременно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'url', help='Адрес запроса, например '
+                        'http://127.0.0.1:9000/api/recipes/')
+        parser.add_argument(
+            '--clients', type=int, default=200,
+            help='Количество клиентов.')
+        parser.add_argument(
+            '--duration', type=float, default=5.0,
+            help='За сколько секунд приходят все клиенты.')
+        parser.add_argument(
+            '--slow-every', type=int, default=10,
+            help='Каждый какой клиент медленный.')
+        parser.add_argument(
+            '--delay', type=float, default=1.0,
+            help='Пауза медленного клиента, секунды.')
+        parser.add_argument(
+            '--token', help='Токен для заголовка Authorization.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Поддерживаются только адреса http://.')
+        started = time.perf_counter()
+        results = asyncio.run(self.run_clients(url, options))
+        elapsed = time.perf_counter() - started
+        statuses = Counter(status for status, _, _ in results)
+        self.stdout.write(
+            f'Клиентов: {len(results)} за {options["duration"]} с, '
+            f'медленный — каждый {options["slow_every"]}-й '
+            f'с паузой {options["delay"]} с, ответы: {dict(statuses)}')
+        for label, slow in (('быстрые', False), ('медленные', True)):
+            timings = [duration for _, is_slow, duration in results
+                       if is_slow == slow]
+            if timings:
+                self.stdout.write(format_timings(label, timings))
+        # Сумма длительностей запросов, деленная на общее время, — среднее
+        # число открытых запросов. Оно растет и когда запросы обслуживаются
+        # одновременно, и когда ждут в очереди, поэтому смотреть его нужно
+        # вместе с задержкой быстрых клиентов.
+        in_flight = sum(duration for _, _, duration in results) / 1000
+        self.stdout.write(
+            f'Общее время: {elapsed:.2f} с, {len(results) / elapsed:.0f} '
+            f'запросов/с, открыто в среднем {in_flight / elapsed:.1f} '
+            f'запросов')
+
+    async def run_clients(self, url, options):
+        interval = options['duration'] / options['clients']
+        return await asyncio.gather(*(
+            self.request(url, options, number * interval,
+                         number % options['slow_every'] == 0)
+            for number in range(options['clients'])))
+
+    @staticmethod
+    async def request(url, options, start_after, slow):
+        """Один клиент: возвращает (статус, медленный ли, длительность в мс).
+        """
+        await asyncio.sleep(start_after)
+        started = time.perf_counter()
+        reader, writer = await asyncio.open_connection(
+            url.hostname, url.port or 80)
+        path = url.path or '/'
+        if url.query:
+            path = f'{path}?{url.query}'
+        writer.write(f'GET {path} HTTP/1.1\r\n'
+                     f'Host: {url.netloc}\r\n'.encode())
+        if slow:
+            await writer.drain()
+            await asyncio.sleep(options['delay'])
+        headers = 'Connection: close\r\n'
+        if options['token']:
+            headers += f'Authorization: Token {options["token"]}\r\n'
+        writer.write(f'{headers}\r\n'.encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        writer.close()
+        await writer.wait_closed()
+        status = status_line.split()[1].decode() if status_line else 'нет'
+        return status, slow, (time.perf_counter() - started) * 1000
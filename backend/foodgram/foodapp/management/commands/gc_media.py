@@ -0,0 +1,74 @@
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from ...constants import IMAGE_VARIANTS, MEDIA_GC_GRACE_PERIOD
+from ...models import Recipe
+
+User = get_user_model()
+
+SOURCES = ((Recipe, 'image'), (User, 'avatar'))
+
+
+def get_stem(name):
+    """Имя файла без расширения и без суффикса уменьшенной копии."""
+    stem = os.path.splitext(name)[0]
+    base, variant = os.path.splitext(stem)
+    if variant[1:] in IMAGE_VARIANTS:
+        return base
+    return stem
+
+
+def scan(path):
+    """Обходит дерево каталогов, не собирая его в память."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = ('Удалить из media файлы, на которые не ссылаются '
+            'рецепты и аватары пользователей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены.')
+        parser.add_argument(
+            '--grace', type=int, default=MEDIA_GC_GRACE_PERIOD,
+            help='Не трогать файлы моложе стольких секунд.')
+
+    def handle(self, *args, **options):
+        root = default_storage.location
+        directories, referenced = set(), set()
+        for model, field in SOURCES:
+            directories.add(model._meta.get_field(field).upload_to)
+            referenced.update(
+                get_stem(name) for name in model.objects.exclude(
+                    **{field: ''}).values_list(field, flat=True).iterator())
+        deadline = time.time() - options['grace']
+        removed = size = 0
+        for directory in sorted(directories):
+            path = os.path.join(root, directory)
+            if not os.path.isdir(path):
+                continue
+            for entry in scan(path):
+                name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                stat = entry.stat(follow_symlinks=False)
+                if get_stem(name) in referenced or stat.st_mtime > deadline:
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+                size += stat.st_size
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов: {removed}, {size / 1024 / 1024:.1f} МБ'))
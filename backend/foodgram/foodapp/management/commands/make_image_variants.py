@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from ...images import make_image_variants
+from ...models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Создать уменьшенные копии изображений рецептов и аватаров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать уже существующие копии.')
+
+    def handle(self, *args, **options):
+        sources = ((Recipe.objects.exclude(image=''), 'image'),
+                   (User.objects.exclude(avatar=''), 'avatar'))
+        for queryset, field in sources:
+            created = failed = 0
+            for obj in queryset.only('pk', field).iterator():
+                try:
+                    make_image_variants(getattr(obj, field),
+                                        force=options['force'])
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'{obj.pk}: {error}')
+                else:
+                    created += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{queryset.model._meta.verbose_name_plural}: '
+                f'обработано {created}, ошибок {failed}'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from ...shopping_list import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = ('Пересобрать списки покупок по корзинам пользователей '
+            'и вывести расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только вывести расхождения, ничего не меняя.')
+
+    def handle(self, *args, **options):
+        mismatches = rebuild_shopping_lists(dry_run=options['check'])
+        for user_id, ingredient_id, stored, expected in mismatches:
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'сохранено {stored}, должно быть {expected}')
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+        elif options['check']:
+            self.stdout.write(self.style.WARNING(
+                f'Найдено расхождений: {len(mismatches)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено расхождений: {len(mismatches)}'))
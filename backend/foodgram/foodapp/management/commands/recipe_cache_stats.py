@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from ...recipe_cache import get_metrics, reset_metrics
+
+
+class Command(BaseCommand):
+    help = 'Показать статистику кеша списка рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счетчики после вывода.')
+
+    def handle(self, *args, **options):
+        metrics = get_metrics()
+        total = metrics['hits'] + metrics['misses']
+        ratio = metrics['hits'] / total if total else 0
+        self.stdout.write(
+            f'Попадания: {metrics["hits"]}, промахи: {metrics["misses"]}, '
+            f'ожидания пересчета: {metrics["waits"]}, '
+            f'доля попаданий: {ratio:.1%}')
+        if options['reset']:
+            reset_metrics()
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from ...counters import recount_counters
+from ...tasks import enqueue
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать счетчики избранного, списков покупок, '
+            'рецептов и подписчиков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help='Поставить пересчет в очередь фоновых задач.')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            enqueue('repair_counters', key='repair_counters')
+            self.stdout.write(self.style.SUCCESS(
+                'Пересчет поставлен в очередь.'))
+            return
+        for counter, repaired in recount_counters().items():
+            self.stdout.write(self.style.SUCCESS(
+                f'{counter}: исправлено записей: {repaired}'))
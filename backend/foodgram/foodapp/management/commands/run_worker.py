@@ -0,0 +1,45 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ...constants import JOB_POLL_INTERVAL
+from ...tasks import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Выполнять фоновые задачи из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Завершиться, когда в очереди не останется готовых задач.')
+        parser.add_argument(
+            '--sleep', type=float, default=JOB_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, в секундах.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.stdout.write('Воркер запущен.')
+        while not self.stopping:
+            close_old_connections()
+            job = claim_job()
+            if job is None:
+                if options['burst']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            job_id, started = job.pk, time.monotonic()
+            succeeded = run_job(job)
+            self.stdout.write(
+                f'{job.name} #{job_id}: '
+                f'{"готово" if succeeded else "ошибка"} '
+                f'за {time.monotonic() - started:.2f} с')
+        self.stdout.write('Воркер остановлен.')
+
+    def stop(self, signum, frame):
+        """Дает текущей задаче завершиться и останавливает воркер."""
+        self.stopping = True
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.18 on 2026-10-17 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodapp", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="recipe_created_at_id_idx"
+            ),
+        ),
+    ]
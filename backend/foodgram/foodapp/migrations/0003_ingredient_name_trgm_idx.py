@@ -0,0 +1,37 @@
+from django.db import DatabaseError, migrations, transaction
+
+
+def create_trigram_index(apps, schema_editor):
+    """Создает GIN-индекс триграмм по UPPER(name), если доступен pg_trgm.
+
+    Без расширения (не PostgreSQL или нет прав на CREATE EXTENSION)
+    поиск ингредиентов работает по индексу в памяти процесса.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx "
+        "ON foodapp_ingredient USING gin (UPPER(name) gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS ingredient_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodapp", "0002_recipe_created_at_id_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
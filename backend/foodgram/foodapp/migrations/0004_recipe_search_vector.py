@@ -0,0 +1,40 @@
+# Generated by Django 4.2.18 on 2026-10-17 07:23
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def fill_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Recipe = apps.get_model("foodapp", "Recipe")
+    Recipe.objects.using(schema_editor.connection.alias).update(
+        search_vector=SearchVector("name", weight="A", config="russian")
+        + SearchVector("text", weight="B", config="russian")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodapp", "0003_ingredient_name_trgm_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="recipe_search_vector_idx"
+            ),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+    ]
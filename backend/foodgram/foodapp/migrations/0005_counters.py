@@ -0,0 +1,64 @@
+# Generated by Django 4.2.18 on 2026-10-17 07:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    counters = (
+        ("Recipe", "favorites_count", "Favorite", "recipe"),
+        ("Recipe", "in_carts_count", "ShoppingCart", "recipe"),
+        ("FoodgramUser", "recipes_count", "Recipe", "author"),
+        ("FoodgramUser", "followers_count", "Subscription", "author"),
+    )
+    for model_name, field, related_name, lookup in counters:
+        model = apps.get_model("foodapp", model_name)
+        related_model = apps.get_model("foodapp", related_name)
+        count = Subquery(
+            related_model.objects.filter(**{lookup: OuterRef("pk")})
+            .order_by()
+            .values(lookup)
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        model.objects.update(**{field: Coalesce(count, Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodapp", "0004_recipe_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="foodgramuser",
+            name="followers_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество подписчиков"
+            ),
+        ),
+        migrations.AddField(
+            model_name="foodgramuser",
+            name="recipes_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество рецептов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В избранном"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="in_carts_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В списках покупок"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.18 on 2026-10-17 07:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_list_items(apps, schema_editor):
+    RecipeIngredient = apps.get_model("foodapp", "RecipeIngredient")
+    ShoppingListItem = apps.get_model("foodapp", "ShoppingListItem")
+    totals = (
+        RecipeIngredient.objects.filter(recipe__in_shopping_cart__isnull=False)
+        .values("recipe__in_shopping_cart__user", "ingredient")
+        .annotate(total_amount=Sum("amount"))
+        .order_by()
+    )
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=row["recipe__in_shopping_cart__user"],
+                ingredient_id=row["ingredient"],
+                total_amount=row["total_amount"],
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodapp", "0005_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShoppingListItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "total_amount",
+                    models.PositiveIntegerField(verbose_name="Количество"),
+                ),
+                (
+                    "ingredient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shopping_list_items",
+                        to="foodapp.ingredient",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shopping_list_items",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ингредиент списка покупок",
+                "verbose_name_plural": "Ингредиенты списков покупок",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="shoppinglistitem",
+            constraint=models.UniqueConstraint(
+                fields=("user", "ingredient"), name="unique_shopping_list_item"
+            ),
+        ),
+        migrations.RunPython(
+            fill_shopping_list_items, migrations.RunPython.noop
+        ),
+    ]
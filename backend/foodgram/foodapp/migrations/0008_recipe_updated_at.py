@@ -0,0 +1,25 @@
+# Generated by Django 4.2.18 on 2026-10-17 07:42
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    Recipe = apps.get_model("foodapp", "Recipe")
+    Recipe.objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodapp", "0007_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Изменен"),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
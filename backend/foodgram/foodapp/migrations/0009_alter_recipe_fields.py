@@ -0,0 +1,85 @@
+# Generated by Django 4.2.18 on 2026-10-17 07:20
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foodapp", "0008_recipe_updated_at"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="recipetag",
+            options={
+                "verbose_name": "Тег рецепта",
+                "verbose_name_plural": "Теги рецепта",
+            },
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="author",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="recipes",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Автор",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="image",
+            field=models.ImageField(upload_to="recipes/", verbose_name="Изображение"),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="name",
+            field=models.CharField(max_length=200, verbose_name="Название"),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="tags",
+            field=models.ManyToManyField(
+                related_name="recipes",
+                through="foodapp.RecipeTag",
+                to="foodapp.tag",
+                verbose_name="Теги",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipe",
+            name="text",
+            field=models.TextField(verbose_name="Описание"),
+        ),
+        migrations.AlterField(
+            model_name="recipeingredient",
+            name="amount",
+            field=models.IntegerField(
+                validators=[django.core.validators.MinValueValidator(1)],
+                verbose_name="Количество",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipeingredient",
+            name="ingredient",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to="foodapp.ingredient",
+                verbose_name="Ингредиент",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recipetag",
+            name="tag",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="tag_recipes",
+                to="foodapp.tag",
+                verbose_name="Тег",
+            ),
+        ),
+    ]
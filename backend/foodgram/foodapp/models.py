@@ -1,17 +1,19 @@
-import os
-
-from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connections, models
+from django.utils import timezone
 
 from .constants import (INGREDIENT_MIN_AMOUNT, INGREDIENT_NAME_MAX_LEN,
+                        JOB_KEY_MAX_LEN, JOB_NAME_MAX_LEN, JOB_STATUS_MAX_LEN,
                         MEASUREMENT_UNIT_MAX_LEN, MIN_COOKING_TIME,
                         RECIPE_HASHCODE_MAX_LEN, RECIPE_NAME_MAX_LEN,
-                        TAG_NAME_MAX_LEN, TAG_SLUG_MAX_LEN,
-                        USER_FIRST_NAME_MAX_LEN, USER_LAST_NAME_MAX_LEN,
-                        USER_USERNAME_MAX_LEN)
+                        RECIPE_SEARCH_CONFIG, TAG_NAME_MAX_LEN,
+                        TAG_SLUG_MAX_LEN, USER_FIRST_NAME_MAX_LEN,
+                        USER_LAST_NAME_MAX_LEN, USER_USERNAME_MAX_LEN)
 
 
 class FoodgramUser(AbstractUser):
@@ -28,6 +30,10 @@ class FoodgramUser(AbstractUser):
     email = models.EmailField(unique=True)
     first_name = models.CharField(max_length=USER_FIRST_NAME_MAX_LEN)
     last_name = models.CharField(max_length=USER_LAST_NAME_MAX_LEN)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
@@ -37,11 +43,12 @@ class FoodgramUser(AbstractUser):
         verbose_name_plural = 'Пользователи'
 
     def delete_avatar(self):
-        """Удаляет файл аватара из базы данных."""
+        """Убирает аватар пользователя.
+
+        Файл остается в хранилище: он может быть общим для нескольких
+        записей и удаляется командой gc_media, когда ссылок на него нет.
+        """
         if self.avatar:
-            avatar_path = os.path.join(settings.MEDIA_ROOT, self.avatar.name)
-            if os.path.exists(avatar_path):
-                os.remove(avatar_path)
             self.avatar = None
             self.save()
 
@@ -78,6 +85,31 @@ class Tag(models.Model):
         return self.name
 
 
+def get_recipe_search_vector():
+    """Поисковый вектор рецепта: название весомее описания."""
+    return (SearchVector('name', weight='A', config=RECIPE_SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=RECIPE_SEARCH_CONFIG))
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Набор рецептов с полнотекстовым поиском."""
+
+    def search(self, text):
+        """Рецепты, подходящие под запрос, от более к менее релевантным.
+
+        В PostgreSQL используется сохраненное поле search_vector
+        с GIN-индексом, в остальных СУБД — поиск по подстроке.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(models.Q(name__icontains=text)
+                               | models.Q(text__icontains=text))
+        query = SearchQuery(text, config=RECIPE_SEARCH_CONFIG,
+                            search_type='websearch')
+        return (self.filter(search_vector=query)
+                .annotate(rank=SearchRank(models.F('search_vector'), query))
+                .order_by('-rank', *Recipe._meta.ordering))
+
+
 class Recipe(models.Model):
     """Рецепт."""
     author = models.ForeignKey(User, verbose_name='Автор',
@@ -94,17 +126,44 @@ class Recipe(models.Model):
         validators=[MinValueValidator(MIN_COOKING_TIME)],
         verbose_name="Время приготовления")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField('Изменен', auto_now=True)
     hashcode = models.CharField(max_length=RECIPE_HASHCODE_MAX_LEN,
                                 unique=True, blank=True, null=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-created_at',)
+        indexes = [models.Index(fields=('-created_at', '-id'),
+                                name='recipe_created_at_id_idx'),
+                   GinIndex(fields=('search_vector',),
+                            name='recipe_search_vector_idx')]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Сохраняет рецепт и обновляет поисковый вектор,
+        если изменились название или описание.
+        """
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'name', 'text'} & set(update_fields):
+            self.update_search_vector()
+
+    def update_search_vector(self):
+        if connections[self._state.db].vendor != 'postgresql':
+            return
+        Recipe.objects.filter(pk=self.pk).update(
+            search_vector=get_recipe_search_vector())
+
 
 class RecipeTag(models.Model):
     """Связующая модель рецепт-тег."""
@@ -189,3 +248,57 @@ class ShoppingCart(models.Model):
                                                name='unique_shopping_cart')]
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя.
+
+    Поддерживается при добавлении и удалении рецептов из списка покупок
+    и при изменении ингредиентов рецептов.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='shopping_list_items')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   related_name='shopping_list_items')
+    total_amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=('user', 'ingredient'), name='unique_shopping_list_item')]
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.total_amount}'
+
+
+class Job(models.Model):
+    """Фоновая задача, выполняемая командой run_worker."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = ((PENDING, 'Ожидает'),
+                (RUNNING, 'Выполняется'),
+                (FAILED, 'Ошибка'))
+
+    name = models.CharField('Задача', max_length=JOB_NAME_MAX_LEN)
+    payload = models.JSONField('Параметры', default=dict)
+    key = models.CharField('Ключ', max_length=JOB_KEY_MAX_LEN, blank=True)
+    status = models.CharField('Статус', max_length=JOB_STATUS_MAX_LEN,
+                              choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    run_at = models.DateTimeField('Запуск не раньше', default=timezone.now)
+    locked_at = models.DateTimeField('Взята в работу', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=('status', 'run_at'),
+                                name='job_status_run_at_idx'),
+                   models.Index(fields=('key',), name='job_key_idx')]
+        ordering = ('run_at', 'id')
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
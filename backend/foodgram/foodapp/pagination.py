@@ -1,18 +1,310 @@
+import base64
+import json
+import operator
+from functools import reduce
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .constants import PAGE_SIZE, PAGINATION_COUNT_CAP
+
+
+class ExactCountPaginator(Paginator):
+    """Пагинатор с точным подсчётом строк через COUNT(*)."""
+    requested_number = 1
+
+    def set_requested_number(self, number):
+        try:
+            self.requested_number = max(int(number), 1)
+        except (TypeError, ValueError):
+            pass
+
+    @property
+    def display_count(self):
+        return self.count
+
+    async def aprepare(self, number):
+        """Заранее считает строки асинхронным запросом,
+        чтобы page() не обращался к базе."""
+        self.__dict__['count'] = await self.object_list.acount()
+
+
+class CappedCountPaginator(ExactCountPaginator):
+    """Пагинатор, считающий строки не дальше `cap` после текущей страницы.
+
+    Если строк больше, в ответ отдаётся строка вида 'N+'.
+    """
+    cap = PAGINATION_COUNT_CAP
+
+    def page(self, number):
+        self.set_requested_number(number)
+        return super().page(number)
+
+    @property
+    def limit(self):
+        return (self.requested_number - 1) * self.per_page + self.cap
+
+    @property
+    def capped_rows(self):
+        # Срез со смещением не сбрасывает сортировку при count(), и без
+        # order_by() PostgreSQL сортировал бы все найденные строки,
+        # например по релевантности поиска, ради одного числа.
+        return self.object_list.order_by()[:self.limit + 1]
+
+    @cached_property
+    def count(self):
+        return self.cap_count(self.capped_rows.count())
+
+    def cap_count(self, count):
+        self.is_capped = count > self.limit
+        return min(count, self.limit)
+
+    async def aprepare(self, number):
+        self.set_requested_number(number)
+        self.__dict__['count'] = self.cap_count(
+            await self.capped_rows.acount())
+
+    @property
+    def display_count(self):
+        if self.is_capped:
+            return f'{self.count}+'
+        return self.count
+
+
+class EstimatedCountPaginator(ExactCountPaginator):
+    """Пагинатор, берущий число строк из статистики планировщика.
+
+    Для нефильтрованных списков в PostgreSQL в ответ отдаётся
+    pg_class.reltuples, в остальных случаях выполняется точный подсчёт.
+    Оценка только показывается: существование страницы и следующей
+    за ней определяются по строкам текущей страницы и одной лишней.
+    """
+
+    def page(self, number):
+        self.set_requested_number(number)
+        return super().page(number)
 
-from .constants import PAGE_SIZE
+    @property
+    def bottom(self):
+        return (self.requested_number - 1) * self.per_page
+
+    @cached_property
+    def estimate(self):
+        return self.get_estimate()
+
+    @cached_property
+    def count(self):
+        if self.estimate is None:
+            return super().count
+        # Строки до текущей страницы, ее строки и одна лишняя, если
+        # за ней есть еще: этого достаточно для page() и has_next().
+        return self.bottom + self.object_list[
+            self.bottom:self.bottom + self.per_page + 1].count()
+
+    @property
+    def display_count(self):
+        if self.estimate is None:
+            return self.count
+        return max(self.estimate, self.count)
+
+    def get_estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if (connection.vendor != 'postgresql' or queryset.query.where
+                or queryset.query.distinct):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        # Для таблиц без собранной статистики reltuples равен -1 или 0.
+        if not row or row[0] <= 0:
+            return None
+        return row[0]
+
+    async def aprepare(self, number):
+        self.set_requested_number(number)
+        # Запрос к pg_class выполняется через курсор, у которого
+        # нет асинхронного варианта.
+        self.__dict__['estimate'] = await sync_to_async(self.get_estimate)()
+        if self.estimate is None:
+            await super().aprepare(number)
+        else:
+            self.__dict__['count'] = self.bottom + await self.object_list[
+                self.bottom:self.bottom + self.per_page + 1].acount()
 
 
 class CustomPagination(PageNumberPagination):
     """Специальный пагинатор, который может
     принимать query-параметр 'limit'.
+
+    Если у вьюсета задан атрибут `cursor_ordering`, клиент может
+    включить курсорную (keyset) пагинацию, передав параметр 'cursor'
+    (для первой страницы — пустой). В этом режиме страница выбирается
+    условием по полям сортировки, а не через OFFSET и COUNT(*),
+    поэтому глубокие страницы стоят столько же, сколько первая.
+
+    Способ подсчёта поля 'count' задаётся атрибутом вьюсета
+    `count_strategy`: 'exact', 'capped' или 'estimate'.
     """
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+    count_strategy = 'exact'
+    paginator_classes = {'exact': ExactCountPaginator,
+                         'capped': CappedCountPaginator,
+                         'estimate': EstimatedCountPaginator}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.configure(request, view)
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_queryset_by_cursor(queryset, request)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Асинхронный вариант paginate_queryset для async-представлений.
+
+        Число строк и страница выбираются асинхронными запросами.
+        """
+        self.configure(request, view)
+        if self.use_cursor:
+            queryset = self.get_cursor_queryset(queryset, request)
+            return self.get_cursor_page([obj async for obj in queryset])
+        self.request = request
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request))
+        await paginator.aprepare(
+            request.query_params.get(self.page_query_param) or 1)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        return self.page.object_list
+
+    def configure(self, request, view):
+        self.django_paginator_class = self.paginator_classes[
+            getattr(view, 'count_strategy', self.count_strategy)]
+        self.cursor_ordering = getattr(view, 'cursor_ordering', None)
+        self.use_cursor = (bool(self.cursor_ordering)
+                           and self.cursor_query_param in request.query_params)
 
     def get_paginated_response(self, data):
-        return Response({'count': self.page.paginator.count,
+        if self.use_cursor:
+            return Response({'next': self.get_next_cursor_link(),
+                             'previous': self.get_previous_cursor_link(),
+                             'results': data})
+        return Response({'count': self.page.paginator.display_count,
                          'next': self.get_next_link(),
                          'previous': self.get_previous_link(),
                          'results': data})
+
+    def paginate_queryset_by_cursor(self, queryset, request):
+        """Возвращает страницу, следующую за позицией из курсора."""
+        return self.get_cursor_page(
+            list(self.get_cursor_queryset(queryset, request)))
+
+    def get_cursor_queryset(self, queryset, request):
+        """Строки страницы и одна лишняя, показывающая, есть ли еще."""
+        self.request = request
+        self.cursor_page_size = self.get_page_size(request)
+        self.reverse, self.position = self.decode_cursor(queryset.model,
+                                                         request)
+        ordering = self.cursor_ordering
+        if self.reverse:
+            ordering = tuple(self.invert_ordering(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.get_position_filter(
+                ordering, self.position))
+        return queryset[:self.cursor_page_size + 1]
+
+    def get_cursor_page(self, results):
+        page_size, reverse, position = (self.cursor_page_size, self.reverse,
+                                        self.position)
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else position is not None
+        if results:
+            self.first_position = self.get_position(results[0])
+            self.last_position = self.get_position(results[-1])
+        else:
+            # Пустая страница: ссылки строятся от исходной позиции.
+            self.first_position = self.last_position = position
+        return results
+
+    def get_next_cursor_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        return self.encode_cursor(False, self.last_position)
+
+    def get_previous_cursor_link(self):
+        if not self.has_previous or self.first_position is None:
+            return None
+        return self.encode_cursor(True, self.first_position)
+
+    @staticmethod
+    def invert_ordering(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_position_filter(ordering, position):
+        """Строит условие «строго после позиции» для составного ключа.
+
+        Для ключа (a, b) по убыванию это (a < x) OR (a = x AND b < y).
+        """
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {ordering[i].lstrip('-'): position[i]
+                     for i in range(index)}
+            conditions.append(Q(**equal, **{f'{name}__{lookup}':
+                                            position[index]}))
+        return reduce(operator.or_, conditions)
+
+    def get_position(self, obj):
+        return [getattr(obj, field.lstrip('-'))
+                for field in self.cursor_ordering]
+
+    def encode_cursor(self, reverse, position):
+        payload = json.dumps([int(reverse)] + [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in position])
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, model, request):
+        """Возвращает направление и позицию из курсора запроса."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return False, None
+        try:
+            reverse, *values = json.loads(
+                base64.urlsafe_b64decode(cursor.encode()).decode())
+            if len(values) != len(self.cursor_ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.cursor_ordering, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return bool(reverse), position
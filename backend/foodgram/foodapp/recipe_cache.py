@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import aget_version
+from .constants import (RECIPE_LIST_CACHE_LOCK_TIMEOUT,
+                        RECIPE_LIST_CACHE_POLL_INTERVAL,
+                        RECIPE_LIST_CACHE_WAIT)
+from .registry import TAGS_VERSION
+from .search import INGREDIENTS_VERSION
+
+RECIPES_VERSION = 'recipes'
+METRICS = ('hits', 'misses', 'waits')
+
+
+def get_metric_key(metric):
+    return f'foodgram:recipe_list:{metric}'
+
+
+def count(metric):
+    key = get_metric_key(metric)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключ мог истечь или быть вытеснен между add и incr.
+        cache.set(key, 1, timeout=None)
+
+
+acount = sync_to_async(count)
+
+
+def get_metrics():
+    """Счетчики попаданий, промахов и ожиданий чужого пересчета."""
+    return {metric: cache.get(get_metric_key(metric), 0)
+            for metric in METRICS}
+
+
+def reset_metrics():
+    cache.delete_many([get_metric_key(metric) for metric in METRICS])
+
+
+VERSIONS = (RECIPES_VERSION, TAGS_VERSION, INGREDIENTS_VERSION)
+
+
+def make_cache_key(request, versions):
+    """Ключ страницы: адрес, упорядоченные непустые параметры и версии
+    рецептов, тегов и ингредиентов."""
+    params = sorted((key, value)
+                    for key, values in request.query_params.lists()
+                    for value in values if value)
+    url = f'{request.build_absolute_uri(request.path)}?{urlencode(params)}'
+    versions = ':'.join(str(version) for version in versions)
+    return (f'foodgram:recipe_list:{versions}:'
+            f'{hashlib.md5(url.encode()).hexdigest()}')
+
+
+async def aget_cache_key(request):
+    return make_cache_key(
+        request, [await aget_version(name) for name in VERSIONS])
+
+
+async def aget_cached_page(request, compute):
+    """Возвращает страницу из кеша или вычисляет ее корутиной `compute`.
+
+    Пересчет выполняет только один запрос: он берет блокировку через
+    cache.add, остальные ждут его результат не дольше
+    RECIPE_LIST_CACHE_WAIT секунд, после чего считают сами. Ожидание
+    чужого пересчета не занимает поток.
+    """
+    key = await aget_cache_key(request)
+    page = await cache.aget(key)
+    if page is not None:
+        await acount('hits')
+        return page
+    await acount('misses')
+    lock = f'{key}:lock'
+    if await cache.aadd(lock, 1, timeout=RECIPE_LIST_CACHE_LOCK_TIMEOUT):
+        try:
+            page = await compute()
+            await cache.aset(key, page,
+                             timeout=settings.RECIPE_LIST_CACHE_TIMEOUT)
+        finally:
+            await cache.adelete(lock)
+        return page
+    await acount('waits')
+    deadline = time.monotonic() + RECIPE_LIST_CACHE_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(RECIPE_LIST_CACHE_POLL_INTERVAL)
+        page = await cache.aget(key)
+        if page is not None:
+            return page
+    return await compute()
@@ -0,0 +1,44 @@
+import threading
+
+from .cache import get_version
+from .models import Tag
+
+TAGS_VERSION = 'tags'
+
+
+class TagRegistry:
+    """Теги, загруженные в память процесса.
+
+    Таблица тегов маленькая и меняется редко, поэтому она читается
+    целиком один раз и перечитывается, только когда меняется версия
+    тегов в общем кеше (см. signals.py).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._tags = {}
+
+    def get_tags(self):
+        version = get_version(TAGS_VERSION)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._tags = {tag.id: tag
+                                  for tag in Tag.objects.order_by('id')}
+                    self._version = version
+        return self._tags
+
+    def all(self):
+        return list(self.get_tags().values())
+
+    def get(self, pk):
+        """Тег по id или None, если такого тега нет."""
+        return self.get_tags().get(pk)
+
+    def as_data(self):
+        return [{'id': tag.id, 'name': tag.name, 'slug': tag.slug}
+                for tag in self.all()]
+
+
+tag_registry = TagRegistry()
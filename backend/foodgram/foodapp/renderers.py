@@ -0,0 +1,151 @@
+import csv
+import io
+import textwrap
+
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SHOPPING_LIST_TITLE = 'Список покупок'
+SHOPPING_LIST_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON-рендерер на orjson.
+
+    Выдает те же байты, что и стандартный JSONRenderer: компактный
+    вывод без экранирования юникода, даты и прочие нестандартные типы
+    кодируются энкодером DRF. Без orjson и для запросов с отступами
+    ('indent' в Accept) используется стандартный рендерер.
+    """
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+               if orjson else 0)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None
+                or self.get_indent(accepted_media_type or '',
+                                   renderer_context or {})):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        # Как и JSONRenderer, экранируем разделители строк для JavaScript.
+        return (orjson.dumps(data, default=JSONEncoder().default,
+                             option=self.options)
+                .replace('\u2028'.encode(), b'\\u2028')
+                .replace('\u2029'.encode(), b'\\u2029'))
+
+
+class FastJSONParser(JSONParser):
+    """JSON-парсер на orjson с откатом на стандартный."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок, по умолчанию — простой текст.
+
+    Список отдается частями: `render_items` возвращает генератор байтов,
+    который вьюха передает в StreamingHttpResponse.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Отрисовывает ответы с ошибками как документ из одной строки."""
+        detail = data.get('detail', data) if isinstance(data, dict) else data
+        return b''.join(self.render_lines([str(detail)]))
+
+    def render_items(self, items):
+        """Отрисовывает строки (название, количество, единица)."""
+        return self.render_lines(
+            f'{name} ({unit}) — {amount}' for name, amount, unit in items)
+
+    def render_lines(self, lines):
+        yield f'{SHOPPING_LIST_TITLE}\n\n'.encode(self.charset)
+        for line in lines:
+            yield f'• {line}\n'.encode(self.charset)
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def write_rows(self, rows):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        for row in rows:
+            writer.writerow(row)
+            yield output.getvalue().encode(self.charset)
+            output.seek(0)
+            output.truncate()
+
+    def render_items(self, items):
+        yield from self.write_rows([SHOPPING_LIST_HEADER])
+        yield from self.write_rows(items)
+
+    def render_lines(self, lines):
+        return self.write_rows([line] for line in lines)
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """Рендерер списка покупок в PDF средствами Pillow.
+
+    Страницы A4 рисуются как изображения шрифтом из настройки
+    SHOPPING_LIST_PDF_FONT и собираются в один PDF-документ.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    page_size = (1240, 1754)
+    margin = 100
+    font_size = 28
+    line_height = 42
+    line_width = 64
+
+    def get_font(self):
+        try:
+            return ImageFont.truetype(settings.SHOPPING_LIST_PDF_FONT,
+                                      self.font_size)
+        except OSError:
+            return ImageFont.load_default(self.font_size)
+
+    def render_lines(self, lines):
+        font = self.get_font()
+        lines_per_page = ((self.page_size[1] - 2 * self.margin)
+                          // self.line_height)
+        wrapped = [SHOPPING_LIST_TITLE, '']
+        for line in lines:
+            wrapped.extend(textwrap.wrap(f'• {line}', self.line_width,
+                                         subsequent_indent='  ') or [''])
+        pages = []
+        for start in range(0, len(wrapped), lines_per_page):
+            page = Image.new('L', self.page_size, 255)
+            draw = ImageDraw.Draw(page)
+            for number, line in enumerate(
+                    wrapped[start:start + lines_per_page]):
+                draw.text(
+                    (self.margin, self.margin + number * self.line_height),
+                    line, font=font, fill=0)
+            pages.append(page)
+        output = io.BytesIO()
+        pages[0].save(output, 'PDF', save_all=True,
+                      append_images=pages[1:], resolution=150)
+        yield output.getvalue()
@@ -0,0 +1,161 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import DatabaseError, connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Upper
+
+from .cache import get_version
+from .constants import INGREDIENT_SIMILARITY_THRESHOLD
+from .models import Ingredient
+
+INGREDIENTS_VERSION = 'ingredients'
+
+
+def get_trigrams(text):
+    """Множество триграмм строки, построенное так же, как в pg_trgm."""
+    trigrams = set()
+    for word in re.findall(r'\w+', text.casefold()):
+        padded = f'  {word} '
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Хранит отсортированный список названий в casefold и отвечает на
+    поиск по началу названия двоичным поиском, не обращаясь к базе.
+    Для нечеткого поиска рядом хранится инвертированный индекс триграмм.
+    Индекс строится при первом запросе и перестраивается, когда меняется
+    версия ингредиентов (см. signals.py).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = ([], [], [], {})
+
+    def get_data(self):
+        version = get_version(INGREDIENTS_VERSION)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._data = self.build()
+                    self._version = version
+        return self._data
+
+    @staticmethod
+    def build():
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator())
+        keys = [row[0] for row in rows]
+        items = [{'id': pk, 'name': name, 'measurement_unit': unit}
+                 for _, pk, name, unit in rows]
+        trigrams = [get_trigrams(key) for key in keys]
+        postings = defaultdict(list)
+        for position, key_trigrams in enumerate(trigrams):
+            for trigram in key_trigrams:
+                postings[trigram].append(position)
+        return keys, items, trigrams, dict(postings)
+
+    def startswith(self, prefix, limit=None):
+        """Ингредиенты, название которых начинается с `prefix`."""
+        keys, items, _, _ = self.get_data()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = start
+        stop = len(keys) if limit is None else min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(prefix):
+            end += 1
+        return items[start:end]
+
+    def search(self, query, limit):
+        """Ранжированный поиск: сначала совпадения по началу названия,
+        затем по подстроке, затем похожие по триграммам названия.
+        """
+        keys, items, trigrams, postings = self.get_data()
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        found = []
+        position = start
+        while (position < len(keys) and len(found) < limit
+               and keys[position].startswith(query)):
+            found.append(position)
+            position += 1
+        seen = set(found)
+        for position, key in enumerate(keys):
+            if len(found) >= limit:
+                break
+            if position not in seen and query in key:
+                found.append(position)
+                seen.add(position)
+        if len(found) >= limit:
+            return [items[position] for position in found]
+        query_trigrams = get_trigrams(query)
+        candidates = set()
+        for trigram in query_trigrams:
+            candidates.update(postings.get(trigram, ()))
+        similar = []
+        for position in candidates - seen:
+            common = len(query_trigrams & trigrams[position])
+            similarity = common / (len(query_trigrams)
+                                   + len(trigrams[position]) - common)
+            if similarity >= INGREDIENT_SIMILARITY_THRESHOLD:
+                similar.append((-similarity, keys[position], position))
+        similar.sort()
+        found.extend(position for _, _, position in similar)
+        return [items[position] for position in found[:limit]]
+
+
+ingredient_index = IngredientIndex()
+
+_pg_trgm_available = None
+
+
+def pg_trgm_available():
+    """Проверяет (один раз на процесс), установлено ли расширение pg_trgm."""
+    global _pg_trgm_available
+    if _pg_trgm_available is None:
+        _pg_trgm_available = False
+        if connection.vendor == 'postgresql':
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1 FROM pg_extension "
+                                   "WHERE extname = 'pg_trgm'")
+                    _pg_trgm_available = cursor.fetchone() is not None
+            except DatabaseError:
+                pass
+    return _pg_trgm_available
+
+
+def search_ingredients(query, limit):
+    """Ранжированный поиск ингредиентов с учетом опечаток.
+
+    В PostgreSQL с pg_trgm поиск выполняется одним запросом по
+    GIN-индексу над UPPER(name), иначе — по индексу в памяти процесса.
+    Оператор % использует порог pg_trgm.similarity_threshold (0.3 по
+    умолчанию), совпадающий с INGREDIENT_SIMILARITY_THRESHOLD.
+    """
+    if not pg_trgm_available():
+        return ingredient_index.search(query, limit)
+    upper_query = query.upper()
+    queryset = (
+        Ingredient.objects
+        .annotate(upper_name=Upper('name'))
+        .filter(Q(upper_name__contains=upper_query)
+                | TrigramSimilar(Upper('name'), upper_query))
+        .annotate(
+            rank=Case(When(upper_name__startswith=upper_query, then=Value(0)),
+                      When(upper_name__contains=upper_query, then=Value(1)),
+                      default=Value(2), output_field=IntegerField()),
+            similarity=TrigramSimilarity(Upper('name'), upper_query))
+        .order_by('rank', '-similarity', 'name')
+        .values('id', 'name', 'measurement_unit'))
+    return list(queryset[:limit])
@@ -1,13 +1,16 @@
-import base64
-import uuid
-
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
 
 from .constants import DEFAULT_RECIPES_AMOUNT_AT_SUBSCRIPTIONS_PAGE
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+from .counters import change_counter
+from .images import decode_base64_image, get_image_variants
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
                      ShoppingCart, Subscription, Tag)
+from .registry import tag_registry
+from .shopping_list import change_recipe_in_shopping_lists
+from .tasks import enqueue_image_variants
 
 User = get_user_model()
 
@@ -16,17 +19,26 @@ class Base64ImageField(serializers.ImageField):
     """Поле для загрузки изображений в формате base64."""
 
     def to_internal_value(self, data):
-        if data.startswith('data:image'):
-            format_, imgstr = data.split(';base64,')
-            ext = format_.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name=f'temp.{ext}')
+        if isinstance(data, str) and data.startswith('data:image'):
+            try:
+                data = decode_base64_image(data)
+            except DjangoValidationError as error:
+                raise serializers.ValidationError(error.messages)
         return super().to_internal_value(data)
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии изображения в WebP и JPEG."""
+
+    def to_representation(self, value):
+        return get_image_variants(value, self.context.get('request'))
+
+
 class FoodgramUserSerializer(serializers.ModelSerializer):
     """Сериализатор пользователя."""
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.ImageField()
+    avatar_images = ImageVariantsField(source='avatar')
 
     class Meta:
         model = User
@@ -36,7 +48,8 @@ class FoodgramUserSerializer(serializers.ModelSerializer):
                   'first_name',
                   'last_name',
                   'is_subscribed',
-                  'avatar')
+                  'avatar',
+                  'avatar_images')
 
     def get_is_subscribed(self, obj):
         """Проверяет, подписан ли пользователь на автора."""
@@ -57,34 +70,36 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     last_name = serializers.CharField(source='author.last_name',
                                       read_only=True)
     avatar = serializers.ImageField(source='author.avatar', read_only=True)
+    avatar_images = ImageVariantsField(source='author.avatar')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='author.recipes.count',
+    recipes_count = serializers.IntegerField(source='author.recipes_count',
                                              read_only=True)
 
     class Meta:
         model = Subscription
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'avatar', 'recipes', 'recipes_count')
+                  'is_subscribed', 'avatar', 'avatar_images', 'recipes',
+                  'recipes_count')
 
     def get_is_subscribed(self, obj):
-        """Проверяет, подписан ли пользователь на автора."""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return Subscription.objects.filter(follower=request.user,
-                                           author=obj.author).exists()
-
-    def get_recipes_count(self, obj):
-        """Количество рецептов автора."""
-        return Recipe.objects.filter(author=obj.author).count()
+        """Подписка всегда принадлежит текущему пользователю."""
+        return True
 
     def get_recipes(self, obj):
-        """Получает список рецептов автора с учетом `recipes_limit`."""
+        """Получает список рецептов автора с учетом `recipes_limit`.
+
+        Рецепты всех авторов страницы заранее выбираются вьюхой
+        и передаются в контексте как `recipes_by_author`.
+        """
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            return RecipeShortSerializer(
+                recipes_by_author.get(obj.author_id, []), many=True).data
         request = self.context.get('request')
         recipes_limit = request.query_params.get('recipes_limit')
         recipes = Recipe.objects.filter(author=obj.author)
-        if recipes_limit and recipes_limit.isdigit():
+        if recipes_limit and recipes_limit.isdecimal():
             return RecipeShortSerializer(recipes[:int(recipes_limit)],
                                          many=True).data
         return RecipeShortSerializer(
@@ -103,17 +118,15 @@ class AvatarSerializer(serializers.ModelSerializer):
     def validate_avatar(self, value):
         """Проверяет, что переданы корректные base64-данные."""
         try:
-            format_, imgstr = value.split(';base64,')
-            ext = format_.split('/')[-1]
-            return base64.b64decode(imgstr), ext
-        except Exception:
-            raise serializers.ValidationError('Invalid base64 image format.')
+            return decode_base64_image(value)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.messages)
 
     def update(self, instance, validated_data):
-        """Обновляет аватар пользователя."""
-        image_data, ext = validated_data['avatar']
-        file_name = f'{uuid.uuid4()}.{ext}'
-        instance.avatar.save(file_name, ContentFile(image_data), save=True)
+        """Обновляет аватар и ставит в очередь создание его копий."""
+        image = validated_data['avatar']
+        instance.avatar.save(image.name, image, save=True)
+        enqueue_image_variants(instance, 'avatar')
         return instance
 
 
@@ -123,13 +136,42 @@ class TagSerializer(serializers.ModelSerializer):
     def to_internal_value(self, data):
         """Принимает id и конвертирует его в объект Tag."""
         if isinstance(data, int):
-            return Tag.objects.get(id=data)
+            tag = tag_registry.get(data)
+            if tag is None:
+                raise serializers.ValidationError(
+                    f'Тега с id {data} не существует.')
+            return tag
 
     class Meta:
         model = Tag
         fields = ('id', 'name', 'slug')
 
 
+class TagPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """Принимает id тега, а отдает тег целиком.
+
+    Id проверяются по реестру тегов в памяти, без запросов к базе.
+    При чтении используются уже загруженные через prefetch_related теги.
+    """
+
+    def use_pk_only_optimization(self):
+        return False
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = tag_registry.get(int(data))
+        except ValueError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
+
+    def to_representation(self, value):
+        return TagSerializer(value).data
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     """Сериализатор ингредиентов."""
 
@@ -139,18 +181,15 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор ингредиентов в рецепте с полем 'amount'."""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient')
-    name = serializers.SerializerMethodField()
-    measurement_unit = serializers.SerializerMethodField()
-
-    def get_name(self, obj):
-        return obj.ingredient.name
+    """Сериализатор ингредиентов в рецепте с полем 'amount'.
 
-    def get_measurement_unit(self, obj):
-        return obj.ingredient.measurement_unit
+    Существование ингредиентов проверяется одним запросом
+    в RecipeSerializer.validate_ingredients.
+    """
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.CharField(source='ingredient.name', read_only=True)
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit', read_only=True)
 
     class Meta:
         model = RecipeIngredient
@@ -160,28 +199,30 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор рецепта."""
     author = serializers.SerializerMethodField()
-    tags = serializers.PrimaryKeyRelatedField(many=True,
-                                              queryset=Tag.objects.all())
+    tags = TagPrimaryKeyField(many=True, queryset=Tag.objects.all())
     ingredients = IngredientInRecipeSerializer(many=True,
                                                source='recipe_ingredients')
     image = Base64ImageField()
+    images = ImageVariantsField(source='image')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
-                  'name', 'image', 'text', 'cooking_time',
-                  'is_favorited', 'is_in_shopping_cart')
+                  'name', 'image', 'images', 'text', 'cooking_time',
+                  'is_favorited', 'is_in_shopping_cart', 'favorites_count')
+        read_only_fields = ('favorites_count',)
 
     def get_author(self, obj):
         """Возвращает автора в нужном формате."""
         request = self.context.get('request')
-        if request.user.is_anonymous:
-            is_subscribed = False
-        else:
-            is_subscribed = Subscription.objects.filter(
-                follower=request.user, author=obj.author).exists()
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is None:
+            is_subscribed = (not request.user.is_anonymous
+                             and Subscription.objects.filter(
+                                 follower=request.user,
+                                 author=obj.author).exists())
         return {
             'email': obj.author.email,
             'id': obj.author.id,
@@ -190,30 +231,35 @@ class RecipeSerializer(serializers.ModelSerializer):
             'last_name': obj.author.last_name,
             'is_subscribed': is_subscribed,
             'avatar': obj.author.avatar.url if obj.author.avatar and hasattr(
-                obj.author.avatar, 'url') else None}
+                obj.author.avatar, 'url') else None,
+            'avatar_images': get_image_variants(
+                obj.author.avatar, request)}
 
     def get_is_favorited(self, obj):
-        """Проверяет, добавлен ли рецепт в избранное."""
+        """Проверяет, добавлен ли рецепт в избранное.
+
+        Использует аннотацию из RecipeViewSet.get_queryset, если она есть.
+        """
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
         return Favorite.objects.filter(recipe=obj, user=request.user).exists()
 
     def get_is_in_shopping_cart(self, obj):
-        """Проверяет, добавлен ли рецепт в список покупок."""
+        """Проверяет, добавлен ли рецепт в список покупок.
+
+        Использует аннотацию из RecipeViewSet.get_queryset, если она есть.
+        """
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
         return ShoppingCart.objects.filter(recipe=obj,
                                            user=request.user).exists()
 
-    def to_representation(self, instance):
-        """Меняет отображение 'tags': при GET отдает объекты, а не id."""
-        representation = super().to_representation(instance)
-        representation['tags'] = TagSerializer(instance.tags.all(),
-                                               many=True).data
-        return representation
-
     def validate_tags(self, tags):
         """Валидация тегов."""
         if not tags:
@@ -230,32 +276,47 @@ class RecipeSerializer(serializers.ModelSerializer):
         if not ingredients:
             raise serializers.ValidationError(
                 {'ingredients': 'Список ингредиентов не может быть пустым.'})
-        ingredient_ids = [ingredient['ingredient'].id for ingredient in
+        ingredient_ids = [ingredient['ingredient_id'] for ingredient in
                           ingredients]
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise serializers.ValidationError(
                 {'ingredients': 'Ингредиенты не должны повторяться.'})
+        found = Ingredient.objects.in_bulk(ingredient_ids)
+        missing = [str(pk) for pk in ingredient_ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиенты с id {} не существуют.'.format(
+                    ', '.join(missing))})
+        for ingredient in ingredients:
+            ingredient['ingredient'] = found[ingredient.pop('ingredient_id')]
         return ingredients
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта с учетом вложенных полей."""
         request = self.context.get('request')
         validated_data['author'] = request.user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipe_ingredients')
-        self.validate_tags(tags)
-        self.validate_ingredients(ingredients)
         recipe = Recipe.objects.create(**validated_data)
+        change_counter(User, request.user.pk, 'recipes_count', 1)
         recipe.tags.set(tags)
         RecipeIngredient.objects.bulk_create([
             RecipeIngredient(recipe=recipe,
                              ingredient=ingredient.get('ingredient'),
                              amount=ingredient['amount']
                              ) for ingredient in ingredients])
+        enqueue_image_variants(recipe, 'image')
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновление рецепта с учетом вложенных полей."""
+        """Обновление рецепта с учетом вложенных полей.
+
+        Изменяются только те строки ингредиентов и тегов и те поля
+        рецепта, которые действительно отличаются от текущих. Время
+        изменения рецепта обновляется, только если что-то изменилось.
+        """
         if 'tags' not in validated_data:
             raise serializers.ValidationError(
                 {'tags': 'Поле tags обязательно для обновления.'})
@@ -263,36 +324,138 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {'ingredients': 'Поле ingredients обязательно для обновления.'}
             )
-        tags = validated_data.pop('tags', None)
-        if tags is not None:
-            self.validate_tags(tags)
-            instance.tags.set(tags)
-        ingredients = validated_data.pop('recipe_ingredients', None)
-        if ingredients is not None:
-            self.validate_ingredients(ingredients)
-            instance.recipe_ingredients.all().delete()
-            RecipeIngredient.objects.bulk_create([
-                RecipeIngredient(recipe=instance,
-                                 ingredient=ingredient.get('ingredient'),
-                                 amount=ingredient['amount']
-                                 ) for ingredient in ingredients])
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        tags_changed = self.update_tags(instance, validated_data.pop('tags'))
+        deltas = self.update_ingredients(
+            instance, validated_data.pop('recipe_ingredients'))
+        if deltas:
+            change_recipe_in_shopping_lists(instance, deltas)
+        changed_fields = [attr for attr, value in validated_data.items()
+                          if getattr(instance, attr) != value]
+        for attr in changed_fields:
+            setattr(instance, attr, validated_data[attr])
+        if changed_fields or tags_changed or deltas:
+            instance.save(update_fields=[*changed_fields, 'updated_at'])
+        if 'image' in changed_fields:
+            enqueue_image_variants(instance, 'image')
         return instance
 
+    @staticmethod
+    def update_tags(instance, tags):
+        """Добавляет новые и удаляет убранные теги рецепта.
+
+        Возвращает True, если набор тегов изменился.
+        """
+        current_ids = {tag.id for tag in instance.tags.all()}
+        new_ids = {tag.id for tag in tags}
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=instance, tag_id=tag_id)
+            for tag_id in new_ids - current_ids])
+        if current_ids - new_ids:
+            RecipeTag.objects.filter(
+                recipe=instance, tag_id__in=current_ids - new_ids).delete()
+        return current_ids != new_ids
+
+    @staticmethod
+    def update_ingredients(instance, ingredients):
+        """Применяет к ингредиентам рецепта только отличия.
+
+        Возвращает изменения количества по id ингредиента.
+        """
+        current = {recipe_ingredient.ingredient_id: recipe_ingredient
+                   for recipe_ingredient in instance.recipe_ingredients.all()}
+        created, changed, deltas = [], [], {}
+        for ingredient in ingredients:
+            ingredient_id = ingredient['ingredient'].id
+            recipe_ingredient = current.pop(ingredient_id, None)
+            if recipe_ingredient is None:
+                created.append(RecipeIngredient(
+                    recipe=instance, ingredient=ingredient['ingredient'],
+                    amount=ingredient['amount']))
+                deltas[ingredient_id] = ingredient['amount']
+            elif recipe_ingredient.amount != ingredient['amount']:
+                deltas[ingredient_id] = (ingredient['amount']
+                                         - recipe_ingredient.amount)
+                recipe_ingredient.amount = ingredient['amount']
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_create(created)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if current:
+            RecipeIngredient.objects.filter(
+                pk__in=[recipe_ingredient.pk
+                        for recipe_ingredient in current.values()]).delete()
+            for ingredient_id, recipe_ingredient in current.items():
+                deltas[ingredient_id] = -recipe_ingredient.amount
+        return deltas
+
+
+class RecipeReadSerializer(RecipeSerializer):
+    """Быстрый сериализатор рецепта для чтения.
+
+    Собирает словарь напрямую из рецепта с аннотациями и загруженными
+    через prefetch_related тегами и ингредиентами, минуя поля DRF.
+    Результат совпадает с RecipeSerializer.to_representation. Авторы
+    и теги, повторяющиеся на странице, собираются один раз.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.authors = {}
+        self.tags = {}
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        image_url = recipe.image.url if recipe.image else None
+        if image_url is not None and request is not None:
+            image_url = request.build_absolute_uri(image_url)
+        return {
+            'id': recipe.id,
+            'tags': [self.get_tag(tag) for tag in recipe.tags.all()],
+            'author': self.get_cached_author(recipe),
+            'ingredients': [
+                {'id': recipe_ingredient.ingredient_id,
+                 'name': recipe_ingredient.ingredient.name,
+                 'measurement_unit':
+                     recipe_ingredient.ingredient.measurement_unit,
+                 'amount': recipe_ingredient.amount}
+                for recipe_ingredient in recipe.recipe_ingredients.all()],
+            'name': recipe.name,
+            'image': image_url,
+            'images': get_image_variants(recipe.image, request),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'is_favorited': self.get_is_favorited(recipe),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+            'favorites_count': recipe.favorites_count,
+        }
+
+    def get_tag(self, tag):
+        if tag.id not in self.tags:
+            self.tags[tag.id] = {'id': tag.id, 'name': tag.name,
+                                 'slug': tag.slug}
+        return self.tags[tag.id]
+
+    def get_cached_author(self, recipe):
+        key = (recipe.author_id, getattr(recipe, 'is_subscribed', None))
+        if key[1] is None:
+            return self.get_author(recipe)
+        if key not in self.authors:
+            self.authors[key] = self.get_author(recipe)
+        return self.authors[key]
+
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Короткий сериализатор рецепта."""
+    images = ImageVariantsField(source='image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор избранного."""
+    images = ImageVariantsField(source='image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
@@ -0,0 +1,185 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .cache import bump_version, get_version
+from .conditional import make_etag
+from .constants import SHOPPING_LIST_CACHE_TIMEOUT
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem, User
+from .search import INGREDIENTS_VERSION
+
+
+def get_shopping_cart_version_name(user_id):
+    return f'shopping_cart:{user_id}'
+
+
+def bump_shopping_cart_version(user_ids):
+    """Помечает устаревшими списки покупок пользователей после фиксации
+    транзакции.
+
+    Иначе параллельный запрос успел бы закешировать под новым ETag
+    список, прочитанный до фиксации изменений.
+    """
+    user_ids = list(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            bump_version(get_shopping_cart_version_name(user_id))
+
+    transaction.on_commit(bump)
+
+
+def get_shopping_list_etag(user, format_):
+    """ETag списка покупок: версия корзины, версия ингредиентов и формат."""
+    return make_etag(user.pk, format_,
+                     get_version(get_shopping_cart_version_name(user.pk)),
+                     get_version(INGREDIENTS_VERSION))
+
+
+def get_shopping_list_items(user):
+    """Строки списка покупок: (название, количество, единица)."""
+    return (ShoppingListItem.objects
+            .filter(user=user)
+            .values_list('ingredient__name', 'total_amount',
+                         'ingredient__measurement_unit')
+            .order_by('ingredient__name')
+            .iterator())
+
+
+def get_recipe_amounts(recipe, sign=1):
+    """Количества ингредиентов рецепта по id ингредиента."""
+    return {ingredient_id: sign * amount
+            for ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe=recipe).values_list('ingredient_id', 'amount')}
+
+
+def change_shopping_lists(user_ids, deltas):
+    """Прибавляет изменения количества к спискам покупок пользователей.
+
+    Строки, количество в которых стало нулевым, удаляются.
+    Вызывается внутри транзакции.
+
+    SELECT ... FOR UPDATE не блокирует еще не созданные строки, поэтому
+    блокируются строки пользователей: параллельные изменения списка
+    одного пользователя выполняются по очереди и не создают одну
+    строку дважды. Порядок по id исключает взаимную блокировку.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not deltas:
+        return
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+    items = {(item.user_id, item.ingredient_id): item
+             for item in ShoppingListItem.objects.filter(
+                 user_id__in=user_ids, ingredient_id__in=deltas)}
+    created, changed, removed = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    created.append(ShoppingListItem(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        total_amount=delta))
+            elif item.total_amount + delta > 0:
+                item.total_amount += delta
+                changed.append(item)
+            else:
+                removed.append(item.pk)
+    ShoppingListItem.objects.bulk_create(created)
+    ShoppingListItem.objects.bulk_update(changed, ('total_amount',))
+    if removed:
+        ShoppingListItem.objects.filter(pk__in=removed).delete()
+
+
+def add_recipe_to_shopping_list(user, recipe):
+    change_shopping_lists([user.pk], get_recipe_amounts(recipe))
+
+
+def remove_recipe_from_shopping_list(user, recipe):
+    change_shopping_lists([user.pk], get_recipe_amounts(recipe, sign=-1))
+
+
+def change_recipe_in_shopping_lists(recipe, deltas):
+    """Переносит изменения ингредиентов рецепта в списки покупок."""
+    if not deltas:
+        return
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe=recipe).values_list('user_id', flat=True))
+    change_shopping_lists(user_ids, deltas)
+    bump_shopping_cart_version(user_ids)
+
+
+def remove_recipe_from_shopping_lists(recipe):
+    """Вычитает удаляемый рецепт из всех списков покупок."""
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe=recipe).values_list('user_id', flat=True))
+    change_shopping_lists(user_ids, get_recipe_amounts(recipe, sign=-1))
+
+
+def calculate_shopping_lists():
+    """Считает списки покупок всех пользователей по корзинам."""
+    return {(row['recipe__in_shopping_cart__user'], row['ingredient']):
+            row['total_amount']
+            for row in RecipeIngredient.objects
+            .filter(recipe__in_shopping_cart__isnull=False)
+            .values('recipe__in_shopping_cart__user', 'ingredient')
+            .annotate(total_amount=Sum('amount'))
+            .order_by()
+            .iterator()}
+
+
+def rebuild_shopping_lists(dry_run=False):
+    """Сверяет списки покупок с корзинами и исправляет расхождения.
+
+    Возвращает список расхождений: (id пользователя, id ингредиента,
+    сохраненное количество, правильное количество).
+    """
+    mismatches = []
+    with transaction.atomic():
+        stored = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.select_for_update()}
+        expected = calculate_shopping_lists()
+        created, changed, removed = [], [], []
+        for key, item in stored.items():
+            total_amount = expected.pop(key, None)
+            if item.total_amount == total_amount:
+                continue
+            mismatches.append((*key, item.total_amount, total_amount))
+            if total_amount is None:
+                removed.append(item.pk)
+            else:
+                item.total_amount = total_amount
+                changed.append(item)
+        for (user_id, ingredient_id), total_amount in expected.items():
+            mismatches.append((user_id, ingredient_id, None, total_amount))
+            created.append(ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id,
+                total_amount=total_amount))
+        if not dry_run:
+            ShoppingListItem.objects.bulk_create(created, batch_size=1000)
+            ShoppingListItem.objects.bulk_update(
+                changed, ('total_amount',), batch_size=1000)
+            ShoppingListItem.objects.filter(pk__in=removed).delete()
+            bump_shopping_cart_version(
+                {user_id for user_id, *_ in mismatches})
+    return mismatches
+
+
+def get_cache_key(etag):
+    return 'foodgram:shopping_list:' + etag.strip('"')
+
+
+def get_cached_body(etag):
+    return cache.get(get_cache_key(etag))
+
+
+def cache_body(chunks, etag):
+    """Отдает части документа дальше и кеширует документ целиком."""
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(get_cache_key(etag), b''.join(body),
+              SHOPPING_LIST_CACHE_TIMEOUT)
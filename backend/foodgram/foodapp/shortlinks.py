@@ -0,0 +1,130 @@
+import string
+import threading
+from collections import OrderedDict
+
+from .cache import aget_version, get_version
+from .constants import (RECIPE_HASHCODE_MAX_LEN, RECIPE_ID_MAX,
+                        SHORT_LINK_CACHE_SIZE, SHORT_LINK_MIN_LEN)
+from .models import Recipe
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+SHORT_LINKS_VERSION = 'short_links'
+
+
+def encode_recipe_id(recipe_id):
+    """Кодирует id рецепта в base62.
+
+    Код дополняется нулями до SHORT_LINK_MIN_LEN символов, поэтому
+    он никогда не совпадает со старыми трехсимвольными hashcode.
+    """
+    code = ''
+    while recipe_id:
+        recipe_id, remainder = divmod(recipe_id, BASE)
+        code = ALPHABET[remainder] + code
+    return code.rjust(SHORT_LINK_MIN_LEN, ALPHABET[0])
+
+
+def decode_short_code(code):
+    """Возвращает id рецепта по base62-коду или None для неверного кода.
+
+    Коды длиннее base62-записи наибольшего id и коды, дающие id
+    за пределами BigAutoField, неверны.
+    """
+    if len(code) > SHORT_CODE_MAX_LEN:
+        return None
+    recipe_id = 0
+    for char in code:
+        position = ALPHABET.find(char)
+        if position == -1:
+            return None
+        recipe_id = recipe_id * BASE + position
+    if recipe_id > RECIPE_ID_MAX:
+        return None
+    return recipe_id
+
+
+SHORT_CODE_MAX_LEN = len(encode_recipe_id(RECIPE_ID_MAX))
+
+
+def get_short_code(recipe):
+    """Код короткой ссылки: сохраненный hashcode или base62 от id."""
+    return recipe.hashcode or encode_recipe_id(recipe.id)
+
+
+class ShortLinkResolver:
+    """LRU-кеш соответствий кода короткой ссылки и id рецепта.
+
+    Повторные переходы по одной ссылке не обращаются к базе.
+    Ненайденные коды не кешируются. Кеш действителен, пока не изменилась
+    версия SHORT_LINKS_VERSION в общем кеше: ее повышает удаление
+    рецепта в любом процессе.
+    """
+
+    def __init__(self, maxsize=SHORT_LINK_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._version = None
+
+    def resolve(self, code):
+        version = get_version(SHORT_LINKS_VERSION)
+        recipe_id = self.get(code, version)
+        if recipe_id is None:
+            recipe_id = self.lookup(code)
+            self.put(code, recipe_id, version)
+        return recipe_id
+
+    async def aresolve(self, code):
+        """Асинхронный вариант resolve для async-представлений."""
+        version = await aget_version(SHORT_LINKS_VERSION)
+        recipe_id = self.get(code, version)
+        if recipe_id is None:
+            recipe_id = await self.alookup(code)
+            self.put(code, recipe_id, version)
+        return recipe_id
+
+    def get(self, code, version):
+        with self._lock:
+            if version != self._version:
+                self._cache.clear()
+                self._version = version
+                return None
+            recipe_id = self._cache.get(code)
+            if recipe_id is not None:
+                self._cache.move_to_end(code)
+            return recipe_id
+
+    def put(self, code, recipe_id, version):
+        if recipe_id is None:
+            return
+        with self._lock:
+            # Пока шел запрос к базе, рецепт могли удалить.
+            if version != self._version:
+                return
+            self._cache[code] = recipe_id
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def lookup(code):
+        if len(code) <= RECIPE_HASHCODE_MAX_LEN:
+            return Recipe.objects.filter(hashcode=code).values_list(
+                'id', flat=True).first()
+        recipe_id = decode_short_code(code)
+        if recipe_id and Recipe.objects.filter(id=recipe_id).exists():
+            return recipe_id
+        return None
+
+    @staticmethod
+    async def alookup(code):
+        if len(code) <= RECIPE_HASHCODE_MAX_LEN:
+            return await Recipe.objects.filter(hashcode=code).values_list(
+                'id', flat=True).afirst()
+        recipe_id = decode_short_code(code)
+        if recipe_id and await Recipe.objects.filter(id=recipe_id).aexists():
+            return recipe_id
+        return None
+
+
+short_links = ShortLinkResolver()
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import revoke_tokens
+from .cache import bump_version
+from .models import Ingredient, Recipe, ShoppingCart, Tag
+from .recipe_cache import RECIPES_VERSION
+from .registry import TAGS_VERSION
+from .search import INGREDIENTS_VERSION
+from .shopping_list import bump_shopping_cart_version
+from .shortlinks import SHORT_LINKS_VERSION
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    """Сбрасывает индекс ингредиентов во всех процессах после фиксации
+    транзакции."""
+    transaction.on_commit(lambda: bump_version(INGREDIENTS_VERSION))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    """Сбрасывает реестр тегов во всех процессах после фиксации
+    транзакции."""
+    transaction.on_commit(lambda: bump_version(TAGS_VERSION))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_list(**kwargs):
+    """Сбрасывает кеш списка рецептов после фиксации транзакции."""
+    transaction.on_commit(lambda: bump_version(RECIPES_VERSION))
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_short_link(**kwargs):
+    """Сбрасывает кеш коротких ссылок во всех процессах после фиксации
+    транзакции."""
+    transaction.on_commit(lambda: bump_version(SHORT_LINKS_VERSION))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_shopping_list(instance, **kwargs):
+    """Сбрасывает кеш списка покупок пользователя после фиксации
+    транзакции."""
+    bump_shopping_cart_version([instance.user_id])
+
+
+@receiver(post_delete, sender=Token)
+def revoke_deleted_token(instance, **kwargs):
+    """Сбрасывает кеш удаленного токена после фиксации транзакции."""
+    # key — первичный ключ токена: после delete() он станет None.
+    key = instance.key
+    transaction.on_commit(lambda: revoke_tokens([key]))
+
+
+@receiver(post_save, sender=User)
+def revoke_user_tokens(instance, created, **kwargs):
+    """Сбрасывает кеш токенов пользователя, например, после деактивации."""
+    if not created:
+        transaction.on_commit(lambda: revoke_tokens(
+            Token.objects.filter(user_id=instance.pk)
+            .values_list('key', flat=True)))
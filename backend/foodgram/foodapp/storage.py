@@ -0,0 +1,50 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по SHA-256 их содержимого.
+
+    Файл 'recipes/photo.png' сохраняется как 'recipes/ab/abcd….png',
+    поэтому одинаковые загрузки занимают место один раз. Файлы не
+    удаляются при замене или удалении ссылок на них: один файл может
+    принадлежать нескольким записям, а неиспользуемые файлы удаляет
+    команда gc_media.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            # Обновляем время изменения, чтобы gc_media не удалил файл,
+            # который снова стал нужен.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    @staticmethod
+    def get_hashed_name(name, content):
+        """Путь файла по хешу содержимого с сохранением каталога."""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        return posixpath.join(posixpath.dirname(name), hexdigest[:2],
+                              hexdigest + ext)
+
+    def save_derived(self, name, content):
+        """Сохраняет производный файл (например, копию изображения)
+        под точным именем, заменяя существующий."""
+        if self.exists(name):
+            self.delete(name)
+        return super().save(name, content)
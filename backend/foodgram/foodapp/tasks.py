@@ -0,0 +1,155 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import bump_version
+from .constants import JOB_LOCK_TIMEOUT, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY
+from .counters import recount_counters
+from .images import make_image_variants
+from .models import Job
+from .recipe_cache import RECIPES_VERSION
+from .renderers import ShoppingListPDFRenderer
+from .shopping_list import (cache_body, get_cached_body,
+                            get_shopping_list_etag, get_shopping_list_items)
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(function):
+    """Регистрирует функцию как фоновую задачу под ее именем."""
+    TASKS[function.__name__] = function
+    return function
+
+
+def enqueue(name, key='', **payload):
+    """Ставит задачу в очередь.
+
+    Если передан `key` и задача с таким ключом еще ждет выполнения,
+    новая не создается. Задача видна воркеру только после фиксации
+    текущей транзакции.
+    """
+    if name not in TASKS:
+        raise ValueError(f'Неизвестная задача: {name}')
+    if key and Job.objects.filter(key=key, status=Job.PENDING).exists():
+        return None
+    return Job.objects.create(name=name, key=key, payload=payload)
+
+
+def claim_job():
+    """Берет в работу первую готовую задачу.
+
+    Строки, заблокированные другими воркерами, пропускаются
+    (SELECT ... FOR UPDATE SKIP LOCKED). Задачи, зависшие в работе
+    дольше JOB_LOCK_TIMEOUT, считаются брошенными и берутся заново.
+    Задача, исчерпавшая JOB_MAX_ATTEMPTS попыток (например, воркер
+    падал на ней каждый раз), не запускается, а помечается как ошибочная.
+    """
+    while True:
+        now = timezone.now()
+        with transaction.atomic():
+            job = (Job.objects
+                   .select_for_update(skip_locked=True)
+                   .filter(Q(status=Job.PENDING, run_at__lte=now)
+                           | Q(status=Job.RUNNING,
+                               locked_at__lt=now - timedelta(
+                                   seconds=JOB_LOCK_TIMEOUT)))
+                   .first())
+            if job is None:
+                return None
+            if job.attempts >= JOB_MAX_ATTEMPTS:
+                logger.error('Задача %s #%s исчерпала попытки',
+                             job.name, job.pk)
+                job.status = Job.FAILED
+                job.locked_at = None
+                job.last_error = job.last_error or (
+                    'Воркер не завершил задачу за отведенные попытки.')
+                job.save(update_fields=('status', 'locked_at',
+                                        'last_error'))
+                continue
+            job.status = Job.RUNNING
+            job.attempts += 1
+            job.locked_at = now
+            job.save(update_fields=('status', 'attempts', 'locked_at'))
+        return job
+
+
+def run_job(job):
+    """Выполняет задачу.
+
+    Выполненная задача удаляется. После ошибки задача откладывается
+    с экспоненциально растущей паузой, а после JOB_MAX_ATTEMPTS
+    попыток помечается как ошибочная.
+    """
+    try:
+        TASKS[job.name](**job.payload)
+    except Exception:
+        logger.exception('Задача %s #%s завершилась ошибкой',
+                         job.name, job.pk)
+        job.last_error = traceback.format_exc()
+        if job.attempts >= JOB_MAX_ATTEMPTS:
+            job.status = Job.FAILED
+        else:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + timedelta(
+                seconds=JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        job.locked_at = None
+        job.save(update_fields=('status', 'run_at', 'locked_at',
+                                'last_error'))
+        return False
+    job.delete()
+    return True
+
+
+@task
+def make_variants(model, pk, field):
+    """Создает уменьшенные копии изображения из поля `field` записи.
+
+    Кешированные страницы рецептов ссылаются на оригиналы изображений
+    рецептов и аватаров, поэтому после создания копий сбрасываются.
+    """
+    obj = (apps.get_model(model).objects
+           .filter(pk=pk).only('pk', field).first())
+    if obj is not None and make_image_variants(getattr(obj, field)):
+        bump_version(RECIPES_VERSION)
+
+
+def enqueue_image_variants(obj, field):
+    enqueue('make_variants', key=f'variants:{obj._meta.label}:{obj.pk}',
+            model=obj._meta.label, pk=obj.pk, field=field)
+
+
+@task
+def render_shopping_list(user_id):
+    """Заранее готовит PDF списка покупок и кладет его в кеш."""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    renderer = ShoppingListPDFRenderer()
+    etag = get_shopping_list_etag(user, renderer.format)
+    if get_cached_body(etag) is None:
+        for _ in cache_body(renderer.render_items(
+                get_shopping_list_items(user)), etag):
+            pass
+
+
+def enqueue_shopping_list(user):
+    enqueue('render_shopping_list', key=f'shopping_list:{user.pk}',
+            user_id=user.pk)
+
+
+@task
+def repair_counters():
+    """Пересчитывает разошедшиеся счетчики."""
+    for counter, repaired in recount_counters().items():
+        if repaired:
+            logger.warning('%s: исправлено записей: %s', counter, repaired)
@@ -0,0 +1,438 @@
+import base64
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.paginator import EmptyPage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .authentication import get_revision_key, token_cache
+from .cache import get_version
+from .constants import JOB_LOCK_TIMEOUT, JOB_MAX_ATTEMPTS
+from .images import make_image_variants
+from .models import (Favorite, Ingredient, Job, Recipe, RecipeIngredient,
+                     RecipeTag, ShoppingCart, Subscription, Tag)
+from .pagination import EstimatedCountPaginator
+from .registry import TAGS_VERSION
+from .search import INGREDIENTS_VERSION
+from .serializers import (RecipeReadSerializer, RecipeSerializer,
+                          SubscriptionSerializer)
+from .shopping_list import get_shopping_cart_version_name
+from .shortlinks import encode_recipe_id
+from .tasks import claim_job
+from .views import RECIPE_PREFETCH, get_recipe_queryset
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image_data_url():
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FoodgramTestCase(TestCase):
+    """Общие данные: два пользователя, теги, ингредиенты и рецепты."""
+    recipes_amount = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author', password='pass',
+            first_name='Автор', last_name='Рецептов')
+        cls.user = User.objects.create_user(
+            email='user@foodgram.ru', username='user', password='pass',
+            first_name='Читатель', last_name='Рецептов')
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {i}', slug=f'tag{i}') for i in range(3))
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(60))
+        cls.recipes = [Recipe.objects.create(
+            author=cls.author, name=f'Рецепт {i}', text='Описание',
+            image='recipes/image.png', cooking_time=10)
+            for i in range(cls.recipes_amount)]
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=cls.tags[i % 3])
+            for i, recipe in enumerate(cls.recipes))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=j + 1)
+            for recipe in cls.recipes
+            for j, ingredient in enumerate(cls.ingredients[:3]))
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[-1])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[-2])
+        Subscription.objects.create(follower=cls.user, author=cls.author)
+        cls.token = Token.objects.create(user=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+
+class RecipeListQueriesTest(FoodgramTestCase):
+    """Число запросов страницы рецептов не зависит от ее размера."""
+
+    def test_anonymous(self):
+        for limit in (5, 50):
+            cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(4):
+                response = self.anonymous.get(
+                    '/api/recipes/', {'limit': limit})
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_authenticated(self):
+        for limit in (5, 50):
+            token_cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(5):
+                response = self.client.get('/api/recipes/', {'limit': limit})
+                results = response.json()['results']
+                self.assertEqual(len(results), limit)
+                self.assertTrue(results[0]['is_favorited'])
+                self.assertTrue(results[1]['is_in_shopping_cart'])
+                self.assertTrue(results[0]['author']['is_subscribed'])
+
+
+class RecipeCreateQueriesTest(FoodgramTestCase):
+    """Число запросов при создании рецепта не зависит от числа
+    ингредиентов."""
+
+    def test_create_with_50_ingredients(self):
+        client = APIClient()
+        token = Token.objects.create(user=self.author)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        data = {
+            'name': 'Рецепт с 50 ингредиентами',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': make_image_data_url(),
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients[:50]],
+        }
+        with self.assertNumQueries(16):
+            response = client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['ingredients']), 50)
+
+
+class ShortLinkTest(FoodgramTestCase):
+    """Короткие ссылки на рецепты."""
+
+    def test_oversized_code(self):
+        for code in ('z' * 12, 'z' * 11, '0' * 1000):
+            with self.subTest(code=code[:12]):
+                response = self.anonymous.get(f'/s/{code}/')
+                self.assertEqual(response.status_code, 404)
+
+    def test_deleted_recipe(self):
+        recipe = self.recipes[0]
+        code = encode_recipe_id(recipe.id)
+        response = self.anonymous.get(f'/s/{code}/')
+        self.assertEqual(response.status_code, 302)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        response = self.anonymous.get(f'/s/{code}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class ShoppingListTest(FoodgramTestCase):
+    """Список покупок."""
+
+    def test_version_bumped_on_commit(self):
+        version_name = get_shopping_cart_version_name(self.user.pk)
+        version = get_version(version_name)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/recipes/{self.recipes[0].id}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(get_version(version_name), version)
+        self.assertNotEqual(get_version(version_name), version)
+
+    def test_download_streams_under_asgi(self):
+        self.client.post(f'/api/recipes/{self.recipes[0].id}/shopping_cart/')
+        url = '/api/recipes/download_shopping_cart/?format=txt'
+        response, content = async_to_sync(self.download_async)(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertIn('Ингредиент 0'.encode(), content)
+        cache.clear()
+        response = self.client.get(url)
+        self.assertFalse(response.is_async)
+        self.assertEqual(b''.join(response.streaming_content), content)
+
+    async def download_async(self, url):
+        response = await self.async_client.get(
+            url, headers={'Authorization': f'Token {self.token}'})
+        return response, b''.join(
+            [chunk async for chunk in response.streaming_content])
+
+
+class ImageUploadTest(FoodgramTestCase):
+    """Загрузка изображений в base64."""
+
+    def test_extension_from_image_format(self):
+        data = make_image_data_url().replace('image/png', 'image/html')
+        response = self.client.put('/api/users/me/avatar/', {'avatar': data},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar.name.endswith('.png'))
+
+    def test_not_allowed_format(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(buffer, 'BMP')
+        data = ('data:image/png;base64,'
+                + base64.b64encode(buffer.getvalue()).decode())
+        response = self.client.put('/api/users/me/avatar/', {'avatar': data},
+                                   format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_base64_with_line_breaks(self):
+        # Шум почти не сжимается: строка длиннее одной части декодирования.
+        buffer = io.BytesIO()
+        Image.effect_noise((300, 300), 100).save(buffer, 'PNG')
+        encoded = base64.encodebytes(buffer.getvalue()).decode()
+        prefix = 'data:image/png;base64'
+        response = self.client.put('/api/users/me/avatar/',
+                                   {'avatar': f'{prefix},{encoded}'},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_corrupted_image(self):
+        prefix, encoded = make_image_data_url().split(',')
+        data = bytearray(base64.b64decode(encoded))
+        data[-20] ^= 0xFF
+        data = f'{prefix},{base64.b64encode(data).decode()}'
+        response = self.client.put('/api/users/me/avatar/', {'avatar': data},
+                                   format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ImageVariantsTest(FoodgramTestCase):
+    """Ссылки на уменьшенные копии изображений."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+        self.recipe.image.save(
+            'image.png', ContentFile(base64.b64decode(
+                make_image_data_url().split(',')[1])), save=False)
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image=self.recipe.image.name)
+
+    def get_images(self):
+        cache.clear()
+        return self.anonymous.get(
+            f'/api/recipes/{self.recipe.id}/').json()['images']
+
+    def test_original_until_variants_exist(self):
+        url = self.get_images()['thumbnail']['webp']
+        self.assertTrue(url.endswith(self.recipe.image.name))
+        make_image_variants(self.recipe.image)
+        url = self.get_images()['thumbnail']['webp']
+        self.assertTrue(url.endswith('.thumbnail.webp'))
+
+    def test_author_avatar_absolute(self):
+        self.author.avatar = self.recipe.image.name
+        self.author.save()
+        response = self.anonymous.get(f'/api/recipes/{self.recipe.id}/')
+        avatar_images = response.json()['author']['avatar_images']
+        self.assertTrue(
+            avatar_images['card']['jpeg'].startswith('http://testserver/'))
+
+
+class JobQueueTest(FoodgramTestCase):
+    """Очередь фоновых задач."""
+
+    def test_abandoned_job_out_of_attempts(self):
+        job = Job.objects.create(
+            name='repair_counters', status=Job.RUNNING,
+            attempts=JOB_MAX_ATTEMPTS,
+            locked_at=timezone.now() - timedelta(seconds=JOB_LOCK_TIMEOUT + 1))
+        with self.assertLogs('foodapp.tasks', 'ERROR'):
+            self.assertIsNone(claim_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, JOB_MAX_ATTEMPTS)
+
+    def test_abandoned_job_reclaimed(self):
+        job = Job.objects.create(
+            name='repair_counters', status=Job.RUNNING, attempts=1,
+            locked_at=timezone.now() - timedelta(seconds=JOB_LOCK_TIMEOUT + 1))
+        self.assertEqual(claim_job(), job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 2))
+
+
+class RecipeValidatorsTest(FoodgramTestCase):
+    """Заголовки условных запросов рецептов."""
+
+    def test_last_modified_only_for_anonymous(self):
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipes[0].id}/'):
+            with self.subTest(url=url):
+                response = self.anonymous.get(url)
+                self.assertIn('ETag', response)
+                self.assertIn('Last-Modified', response)
+                response = self.client.get(url)
+                self.assertIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+
+
+class RecipeReadSerializerTest(FoodgramTestCase):
+    """RecipeReadSerializer отдает то же, что и RecipeSerializer."""
+
+    def assert_same_output(self, user, queryset):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        context = {'request': request}
+        recipes = list(queryset.prefetch_related(*RECIPE_PREFETCH))
+        self.assertEqual(
+            json.loads(JSONRenderer().render(RecipeReadSerializer(
+                recipes, many=True, context=context).data)),
+            json.loads(JSONRenderer().render(RecipeSerializer(
+                recipes, many=True, context=context).data)))
+
+    def test_same_output(self):
+        User.objects.filter(pk=self.author.pk).update(
+            avatar='users/avatar.png')
+        for user in (AnonymousUser(), self.user, self.author):
+            with self.subTest(user=user):
+                self.assert_same_output(user, get_recipe_queryset(user))
+                self.assert_same_output(
+                    user, Recipe.objects.select_related('author'))
+
+
+class ReadViewRoutingTest(FoodgramTestCase):
+    """Чтение обслуживают только асинхронные представления."""
+
+    def test_read_only_methods(self):
+        ingredient_id = self.ingredients[0].id
+        for url in ('/api/tags/', f'/api/ingredients/{ingredient_id}/'):
+            with self.subTest(url=url):
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 405)
+                self.assertEqual(response['Allow'], 'GET, HEAD, OPTIONS')
+                self.assertIn('detail', response.json())
+
+    def test_no_format_suffix_routes(self):
+        for url in ('/api/recipes.json', '/api/tags.json',
+                    f'/api/recipes/{self.recipes[0].id}.json'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_non_decimal_limit_ignored(self):
+        response = self.client.get('/api/ingredients/',
+                                   {'name': 'ингредиент 5', 'limit': '²'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 11)
+
+
+class SubscriptionRecipesLimitTest(FoodgramTestCase):
+    """Нечисловой recipes_limit заменяется значением по умолчанию."""
+
+    def test_list(self):
+        response = self.client.get('/api/users/subscriptions/',
+                                   {'recipes_limit': '²'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results'][0]['recipes']), 3)
+
+    def test_serializer_without_prefetched_recipes(self):
+        request = Request(APIRequestFactory().get(
+            '/api/users/subscriptions/', {'recipes_limit': '²'}))
+        data = SubscriptionSerializer(
+            Subscription.objects.get(follower=self.user),
+            context={'request': request}).data
+        self.assertEqual(len(data['recipes']), 3)
+
+
+class TokenAuthenticationTest(FoodgramTestCase):
+    """Кеш токенов сбрасывается при выходе и деактивации."""
+
+    def test_logout_revokes_token(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+            self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_missing_revision_not_trusted(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.delete(get_revision_key(self.token.key))
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+
+class EstimatedCountPaginatorTest(FoodgramTestCase):
+    """Оценка числа строк не влияет на выбор страниц."""
+
+    def get_paginator(self, estimate):
+        paginator = EstimatedCountPaginator(Recipe.objects.order_by('id'), 10)
+        paginator.get_estimate = lambda: estimate
+        return paginator
+
+    def test_under_estimate(self):
+        page = self.get_paginator(5).page(6)
+        self.assertEqual(len(page), 10)
+        self.assertFalse(page.has_next())
+        paginator = self.get_paginator(5)
+        self.assertTrue(paginator.page(3).has_next())
+        self.assertEqual(paginator.display_count, 31)
+
+    def test_over_estimate(self):
+        paginator = self.get_paginator(1000)
+        self.assertFalse(paginator.page(6).has_next())
+        self.assertEqual(paginator.display_count, 1000)
+        with self.assertRaises(EmptyPage):
+            self.get_paginator(1000).page(7)
+
+
+class CatalogVersionTest(FoodgramTestCase):
+    """Версии справочников меняются только после фиксации транзакции."""
+
+    def assert_bumped_on_commit(self, version_name, change):
+        version = get_version(version_name)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+            self.assertEqual(get_version(version_name), version)
+        self.assertNotEqual(get_version(version_name), version)
+
+    def test_ingredients(self):
+        self.assert_bumped_on_commit(
+            INGREDIENTS_VERSION,
+            lambda: Ingredient.objects.create(name='Соль',
+                                              measurement_unit='г'))
+
+    def test_tags(self):
+        self.assert_bumped_on_commit(
+            TAGS_VERSION,
+            lambda: Tag.objects.create(name='Новый тег', slug='new'))
@@ -1,44 +1,149 @@
-import csv
-import hashlib
-import io
 from urllib.parse import urljoin
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404, redirect
-from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from djoser.views import UserViewSet
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.generics import ListAPIView
+from rest_framework.mixins import (CreateModelMixin, DestroyModelMixin,
+                                   UpdateModelMixin)
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
-
-from .constants import FOODGRAM_URL, RECIPE_HASHCODE_MAX_LEN
-from .filters import RecipeFilter
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Subscription, Tag)
+from rest_framework.viewsets import GenericViewSet
+
+from .authentication import CachedTokenAuthentication
+from .conditional import get_not_modified, set_validators
+from .constants import (DEFAULT_RECIPES_AMOUNT_AT_SUBSCRIPTIONS_PAGE,
+                        FOODGRAM_URL)
+from .counters import change_counter
+from .images import get_image_variants
+from .models import (Favorite, Recipe, RecipeIngredient, ShoppingCart,
+                     Subscription)
 from .pagination import CustomPagination
+from .renderers import (ShoppingListCSVRenderer, ShoppingListPDFRenderer,
+                        ShoppingListTextRenderer)
 from .serializers import (AvatarSerializer, FavoriteSerializer,
-                          FoodgramUserSerializer, IngredientSerializer,
-                          RecipeSerializer, RecipeShortSerializer,
-                          SubscriptionSerializer, TagSerializer)
+                          FoodgramUserSerializer, RecipeSerializer,
+                          RecipeShortSerializer, SubscriptionSerializer)
+from .shopping_list import (add_recipe_to_shopping_list, cache_body,
+                            get_cached_body, get_shopping_list_etag,
+                            get_shopping_list_items,
+                            remove_recipe_from_shopping_list,
+                            remove_recipe_from_shopping_lists)
+from .shortlinks import get_short_code
+from .tasks import enqueue_shopping_list
 
 User = get_user_model()
 
 
+def get_subscriptions(follower):
+    """Подписки пользователя вместе с авторами.
+
+    Число рецептов автора берется из его поля recipes_count.
+    """
+    return (Subscription.objects.filter(follower=follower)
+            .select_related('author'))
+
+
+def get_recipes_by_author(request, author_ids):
+    """Последние рецепты каждого из авторов одним запросом.
+
+    Число рецептов на автора задается параметром `recipes_limit`.
+    """
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit and recipes_limit.isdecimal():
+        recipes_limit = int(recipes_limit)
+    else:
+        recipes_limit = DEFAULT_RECIPES_AMOUNT_AT_SUBSCRIPTIONS_PAGE
+    recipes = (Recipe.objects
+               .filter(author_id__in=author_ids)
+               .only('id', 'author_id', 'name', 'image', 'cooking_time')
+               .annotate(row_number=Window(
+                   RowNumber(), partition_by=F('author_id'),
+                   order_by=(F('created_at').desc(), F('id').desc())))
+               .filter(row_number__lte=recipes_limit)
+               .order_by('author_id', 'row_number'))
+    recipes_by_author = {author_id: [] for author_id in author_ids}
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
+
+
+# Теги и ингредиенты подгружаются только для рецептов, которые
+# действительно сериализуются, а не для ответов 304.
+RECIPE_PREFETCH = (
+    'tags',
+    Prefetch('recipe_ingredients',
+             queryset=RecipeIngredient.objects.select_related('ingredient')))
+
+
+def get_recipe_queryset(user):
+    """Рецепты с авторами и флагами пользователя `user`.
+
+    Флаги вычисляются подзапросами в том же SQL-запросе,
+    поэтому число запросов не зависит от размера страницы.
+    """
+    queryset = (Recipe.objects.select_related('author')
+                .defer('search_vector'))
+    if user.is_anonymous:
+        return queryset.annotate(is_favorited=Value(False),
+                                 is_in_shopping_cart=Value(False),
+                                 is_subscribed=Value(False))
+    return queryset.annotate(
+        is_favorited=Exists(Favorite.objects.filter(
+            user=user, recipe=OuterRef('pk'))),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('pk'))),
+        is_subscribed=Exists(Subscription.objects.filter(
+            follower=user, author=OuterRef('author'))))
+
+
+async def iterate_async(iterator):
+    """Асинхронный итератор поверх синхронного.
+
+    Каждый шаг выполняется в потоке для синхронного кода, поэтому
+    итератор может обращаться к базе.
+    """
+    iterator = iter(iterator)
+    get_next = sync_to_async(next)
+    done = object()
+    while True:
+        chunk = await get_next(iterator, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def get_streaming_content(request, chunks):
+    """Части ответа для StreamingHttpResponse.
+
+    Под ASGI Django читает синхронный итератор целиком, прежде чем
+    отправить ответ, поэтому там части отдаются асинхронно. Запрос
+    под WSGI узнаем по ключу 'wsgi.version': его обязан передать
+    WSGI-сервер (PEP 3333), а ASGIRequest его не задает.
+    """
+    if 'wsgi.version' in request.META:
+        return chunks
+    return iterate_async(chunks)
+
+
 class FoodgramUserViewSet(UserViewSet):
     """Вьюсет для пользователей."""
     queryset = User.objects.all()
     serializer_class = FoodgramUserSerializer
     pagination_class = CustomPagination
+    count_strategy = 'estimate'
 
     def get_permissions(self):
         if self.action in ('list', 'retrieve', 'create'):
@@ -48,7 +153,7 @@ class FoodgramUserViewSet(UserViewSet):
 
 class SubscribeView(APIView):
     """Подписаться/отписаться на/от пользователя."""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def post(self, request, author_id):
@@ -63,11 +168,13 @@ class SubscribeView(APIView):
                 {"error": "Вы уже подписаны на этого пользователя."},
                 status=status.HTTP_400_BAD_REQUEST)
 
-        subscription = Subscription.objects.create(follower=request.user,
-                                                   author=author)
-        recipes_limit = request.query_params.get('recipes_limit')
+        with transaction.atomic():
+            subscription = Subscription.objects.create(follower=request.user,
+                                                       author=author)
+            change_counter(User, author.pk, 'followers_count', 1)
         serializer = SubscriptionSerializer(subscription, context={
-            'request': request, 'recipes_limit': recipes_limit})
+            'request': request,
+            'recipes_by_author': get_recipes_by_author(request, [author.id])})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, author_id):
@@ -79,7 +186,9 @@ class SubscribeView(APIView):
             return Response(
                 {"error": "Вы не подписаны на этого автора."},
                 status=status.HTTP_400_BAD_REQUEST)
-        subscription.delete()
+        with transaction.atomic():
+            deleted, _ = subscription.delete()
+            change_counter(User, author.pk, 'followers_count', -deleted)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -89,9 +198,20 @@ class ListMySubscriptionsView(ListAPIView):
     serializer_class = SubscriptionSerializer
     permission_classes = (IsAuthenticated,)
     pagination_class = CustomPagination
+    cursor_ordering = ('-id',)
 
     def get_queryset(self):
-        return Subscription.objects.filter(follower=self.request.user)
+        return get_subscriptions(self.request.user).order_by('-id')
+
+    def list(self, request, *args, **kwargs):
+        """Рецепты всех авторов страницы выбираются одним запросом."""
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()))
+        serializer = self.get_serializer(page, many=True, context={
+            **self.get_serializer_context(),
+            'recipes_by_author': get_recipes_by_author(
+                request, [subscription.author_id for subscription in page])})
+        return self.get_paginated_response(serializer.data)
 
 
 class AvatarView(APIView):
@@ -106,8 +226,11 @@ class AvatarView(APIView):
             serializer.save()
             avatar_url = urljoin(settings.MEDIA_URL, request.user.avatar.name)
             full_avatar_url = request.build_absolute_uri(avatar_url)
-            return Response({'avatar': full_avatar_url},
-                            status=status.HTTP_200_OK)
+            return Response(
+                {'avatar': full_avatar_url,
+                 'avatar_images': get_image_variants(request.user.avatar,
+                                                     request)},
+                status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request):
@@ -116,43 +239,35 @@ class AvatarView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
-    permission_classes = (AllowAny,)
-    queryset = Tag.objects.all()
-    serializer_class = TagSerializer
+class RecipeViewSet(CreateModelMixin, UpdateModelMixin, DestroyModelMixin,
+                    GenericViewSet):
+    """Вьюсет рецептов: запись и действия над рецептом.
 
-
-class IngredientViewSet(ReadOnlyModelViewSet):
-    """Вьюсет для просмотра ингредиентов."""
-    permission_classes = (AllowAny,)
-    queryset = Ingredient.objects.all()
-    serializer_class = IngredientSerializer
-    filter_backends = (DjangoFilterBackend,)
+    Список и рецепт отдают асинхронные представления из async_views.
+    """
+    queryset = Recipe.objects.select_related('author').defer('search_vector')
+    serializer_class = RecipeSerializer
+    permission_classes = (IsAuthenticatedOrReadOnly,)
 
     def get_queryset(self):
-        """Фильтрация ингредиентов по началу названия, если предоставлено."""
-        queryset = Ingredient.objects.all()
-        name = self.request.query_params.get('name')
-        if name:
-            queryset = queryset.filter(name__istartswith=name)
-        return queryset
+        return get_recipe_queryset(self.request.user)
 
-
-class RecipeViewSet(ModelViewSet):
-    """Вьюсет рецептов."""
-    queryset = Recipe.objects.prefetch_related('tags', 'recipe_ingredients')
-    serializer_class = RecipeSerializer
-    permission_classes = (IsAuthenticatedOrReadOnly,)
-    pagination_class = CustomPagination
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = RecipeFilter
+    def perform_create(self, serializer):
+        serializer.save()
+        self.reload_instance(serializer)
 
     def perform_update(self, serializer):
         """Запрещает редактирование чужих рецептов."""
-        recipe = self.get_object()
+        recipe = serializer.instance
         if recipe.author != self.request.user:
             raise PermissionDenied('Вы не можете редактировать чужой рецепт.')
         serializer.save()
+        self.reload_instance(serializer)
+
+    def reload_instance(self, serializer):
+        """Перечитывает рецепт с аннотациями и prefetch для ответа."""
+        serializer.instance = self.get_queryset().prefetch_related(
+            *RECIPE_PREFETCH).get(pk=serializer.instance.pk)
 
     def destroy(self, request, *args, **kwargs):
         recipe = self.get_object()
@@ -160,26 +275,20 @@ class RecipeViewSet(ModelViewSet):
             raise PermissionDenied('Вы не може те удалить чужой рецепт.')
         return super().destroy(request, *args, **kwargs)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        remove_recipe_from_shopping_lists(instance)
+        instance.delete()
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+
     @action(detail=True, methods=['GET'], url_path='get-link')
     def get_short_link(self, request, pk=None):
-        """Создает короткую ссылку на рецепт."""
-        recipe = get_object_or_404(Recipe, id=pk)
-        if not recipe.hashcode:
-            hashcode = hashlib.md5(str(recipe.id).encode()).hexdigest()[
-                :RECIPE_HASHCODE_MAX_LEN]
-            recipe.hashcode = hashcode
-            recipe.save()
-        short_link = f'{FOODGRAM_URL}s/{recipe.hashcode}'
+        """Возвращает короткую ссылку на рецепт."""
+        recipe = get_object_or_404(Recipe.objects.only('id', 'hashcode'),
+                                   id=pk)
+        short_link = f'{FOODGRAM_URL}s/{get_short_code(recipe)}'
         return Response({'short-link': short_link}, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=['GET'], url_path='s/(?P<hashcode>[^/.]+)')
-    def redirect_short_link(self, request, hashcode=None):
-        """Перенаправляет с короткой ссылки
-        на страницу рецепта на фронтенде.
-        """
-        recipe = get_object_or_404(Recipe, hashcode=hashcode)
-        return redirect(f'{FOODGRAM_URL}recipes/{recipe.id}')
-
     @action(detail=True, methods=['POST', 'DELETE'],
             permission_classes=[IsAuthenticated], url_path='favorite')
     def favorite(self, request, pk=None):
@@ -192,11 +301,18 @@ class RecipeViewSet(ModelViewSet):
             if not favorite.exists():
                 return Response({'detail': 'Рецепта нет в избранном.'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            favorite.delete()
+            with transaction.atomic():
+                deleted, _ = favorite.delete()
+                change_counter(Recipe, recipe.pk, 'favorites_count', -deleted,
+                               updated_at=timezone.now())
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        favorite, created = Favorite.objects.get_or_create(user=request.user,
-                                                           recipe=recipe)
+        with transaction.atomic():
+            favorite, created = Favorite.objects.get_or_create(
+                user=request.user, recipe=recipe)
+            if created:
+                change_counter(Recipe, recipe.pk, 'favorites_count', 1,
+                               updated_at=timezone.now())
         if not created:
             return Response({'detail': 'Рецепт уже в избранном.'},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -215,11 +331,21 @@ class RecipeViewSet(ModelViewSet):
             if not shopping_cart.exists():
                 return Response({'detail': 'Рецепта нет в списке покупок'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            shopping_cart.delete()
+            with transaction.atomic():
+                deleted, _ = shopping_cart.delete()
+                change_counter(Recipe, recipe.pk, 'in_carts_count', -deleted)
+                if deleted:
+                    remove_recipe_from_shopping_list(request.user, recipe)
+                    enqueue_shopping_list(request.user)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        shopping_cart, created = ShoppingCart.objects.get_or_create(
-            user=request.user, recipe=recipe)
+        with transaction.atomic():
+            shopping_cart, created = ShoppingCart.objects.get_or_create(
+                user=request.user, recipe=recipe)
+            if created:
+                change_counter(Recipe, recipe.pk, 'in_carts_count', 1)
+                add_recipe_to_shopping_list(request.user, recipe)
+                enqueue_shopping_list(request.user)
         if not created:
             return Response({'detail': 'Рецепт уже в списке покупок'},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -229,23 +355,31 @@ class RecipeViewSet(ModelViewSet):
 
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated],
+            renderer_classes=(ShoppingListCSVRenderer,
+                              ShoppingListTextRenderer,
+                              ShoppingListPDFRenderer),
             url_path='download_shopping_cart')
     def download_shopping_cart(self, request):
-        """Скачивание списка покупок в формате CSV."""
-        ingredients = (RecipeIngredient.objects
-                       .filter(recipe__in_shopping_cart__user=request.user)
-                       .values('ingredient__name',
-                               'ingredient__measurement_unit')
-                       .annotate(total_amount=Sum('amount')))
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Ингредиент', 'Количество', 'Единица измерения'])
-        for item in ingredients:
-            writer.writerow([item['ingredient__name'],
-                             item['total_amount'],
-                             item['ingredient__measurement_unit']])
-        response = HttpResponse(output.getvalue(),
-                                content_type='text/csv')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_list.csv"'
-        return response
+        """Скачивание списка покупок в формате CSV, TXT или PDF.
+
+        Формат выбирается параметром 'format'. Пока корзина не менялась,
+        на запрос с If-None-Match отдается 304, а повторные запросы
+        обслуживаются из кеша.
+        """
+        renderer = request.accepted_renderer
+        etag = get_shopping_list_etag(request.user, renderer.format)
+        not_modified = get_not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        body = get_cached_body(etag)
+        if body is None:
+            response = StreamingHttpResponse(
+                get_streaming_content(request, cache_body(
+                    renderer.render_items(
+                        get_shopping_list_items(request.user)), etag)),
+                content_type=renderer.media_type)
+        else:
+            response = HttpResponse(body, content_type=renderer.media_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"')
+        return set_validators(response, etag)
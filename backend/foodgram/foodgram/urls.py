@@ -4,14 +4,18 @@ from django.contrib import admin
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from foodapp.views import (AvatarView, FoodgramUserViewSet, IngredientViewSet,
+from foodapp.async_views import (IngredientDetailView, IngredientListView,
+                                 RecipeDetailView, RecipeListView,
+                                 TagDetailView, TagListView,
+                                 redirect_short_link)
+from foodapp.views import (AvatarView, FoodgramUserViewSet,
                            ListMySubscriptionsView, RecipeViewSet,
-                           SubscribeView, TagViewSet)
+                           SubscribeView)
 
 router = DefaultRouter()
+# Маршруты вида /api/recipes.json обходили бы асинхронное чтение.
+router.include_format_suffixes = False
 router.register(r'users', FoodgramUserViewSet)
-router.register(r'tags', TagViewSet)
-router.register(r'ingredients', IngredientViewSet)
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
@@ -21,9 +25,16 @@ urlpatterns = [
     path('api/users/me/avatar/', AvatarView.as_view()),
     path('api/users/<int:author_id>/subscribe/', SubscribeView.as_view()),
     path('api/users/subscriptions/', ListMySubscriptionsView.as_view()),
+    # Чтение обслуживается асинхронно, запись передается RecipeViewSet.
+    path('api/recipes/', RecipeListView.as_view()),
+    path('api/recipes/<int:pk>/', RecipeDetailView.as_view()),
+    path('api/recipes/s/<str:hashcode>/', redirect_short_link),
+    path('api/tags/', TagListView.as_view()),
+    path('api/tags/<int:pk>/', TagDetailView.as_view()),
+    path('api/ingredients/', IngredientListView.as_view()),
+    path('api/ingredients/<int:pk>/', IngredientDetailView.as_view()),
     path('api/', include(router.urls)),
-    path('s/<str:hashcode>/',
-         RecipeViewSet.as_view({'get': 'redirect_short_link'})),
+    path('s/<str:hashcode>/', redirect_short_link),
 ]
 
 if settings.DEBUG: